@@ -0,0 +1,56 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from database_manager import DatabaseManager
+from tk_result_pump import TkResultPump
+
+
+class AsyncDatabaseManager:
+
+    def __init__(self, db_manager: DatabaseManager, widget):
+        self.db_manager = db_manager
+        self.widget = widget
+
+        # Все запросы выполняются в одном выделенном потоке базы данных
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self._pump = TkResultPump(widget, self._deliver, "Ошибка обработки результата запроса")
+
+    def submit(self, func: Callable, *args,
+               callback: Optional[Callable[[Any], None]] = None,
+               error_callback: Optional[Callable[[Exception], None]] = None,
+               **kwargs) -> Future:
+        future = self._executor.submit(func, *args, **kwargs)
+        self._pump.track(future, callback, error_callback)
+        return future
+
+    def __getattr__(self, name: str):
+        # Методы DatabaseManager вызываются с теми же аргументами плюс callback/error_callback
+        attribute = getattr(self.db_manager, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, callback=None, error_callback=None, **kwargs) -> Future:
+            return self.submit(attribute, *args, callback=callback, error_callback=error_callback, **kwargs)
+
+        return call
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self._executor.submit(func, *args, **kwargs))
+
+    def _deliver(self, future: Future, callback: Optional[Callable[[Any], None]],
+                 error_callback: Optional[Callable[[Exception], None]]):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is not None:
+            if error_callback:
+                error_callback(error)
+            else:
+                print(f"Ошибка фонового запроса: {error}")
+        elif callback:
+            callback(future.result())
+
+    def shutdown(self):
+        self._executor.submit(self.db_manager.release_connection)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пакетный расчет материалов по файлу заказов без графического интерфейса
+
+Файл заказов (CSV или XLSX) читается частями, части рассчитываются в пуле
+процессов через MaterialCalculator.calculate_batch, результаты дописываются
+в выходной файл по мере готовности. Память не растет с размером файла.
+
+Столбцы входного файла: product_type_id, material_type_id, quantity, param1, param2
+(по именам или первые пять столбцов по порядку); прочие столбцы переносятся в результат.
+
+Использование:
+    python batch_calculator.py заказы.csv результат.csv [--db partners_system.db]
+                               [--chunk-size 50000] [--workers N]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from database_manager import DatabaseManager
+from file_chunks import iter_file_chunks
+from material_calculator import MaterialCalculator
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Справочники, без которых расчет невозможен
+REQUIRED_TABLES = ('product_types', 'material_types')
+
+# Калькулятор процесса-обработчика: соединение SQLite нельзя передать между процессами
+_calculator: Optional[MaterialCalculator] = None
+
+
+def open_database(db_path: str) -> DatabaseManager:
+    # Без справочников каждая строка получила бы ошибку "Тип продукции не найден",
+    # поэтому пустая или чужая база отклоняется до начала расчета
+    db_manager = DatabaseManager(db_path)
+    if not db_manager.connect():
+        raise ValueError(f"Не удалось подключиться к базе данных: {db_path}")
+
+    tables = {row[0] for row in db_manager.connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    ).fetchall()}
+    missing_tables = [table_name for table_name in REQUIRED_TABLES if table_name not in tables]
+    if missing_tables:
+        db_manager.disconnect()
+        raise ValueError(f"В базе данных {db_path} нет таблиц: {', '.join(missing_tables)}")
+
+    empty_tables = [
+        table_name for table_name in REQUIRED_TABLES
+        if db_manager.connection.execute(f"SELECT 1 FROM {table_name} LIMIT 1").fetchone() is None
+    ]
+    if empty_tables:
+        db_manager.disconnect()
+        raise ValueError(f"В базе данных {db_path} пустые справочники: {', '.join(empty_tables)}")
+    return db_manager
+
+
+def init_worker(db_path: str):
+    global _calculator
+    _calculator = MaterialCalculator(open_database(db_path))
+
+
+def calculate_chunk(orders: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    # В основной процесс возвращаются только рассчитанные столбцы, исходная часть остается там
+    result = _calculator.calculate_batch(orders[list(MaterialCalculator.BATCH_COLUMNS)])
+    return result['material_required'].to_numpy(), result['error_code'].to_numpy()
+
+
+def prepare_orders(df: pd.DataFrame) -> pd.DataFrame:
+    columns = MaterialCalculator.BATCH_COLUMNS
+    if all(column in df.columns for column in columns):
+        return df.reset_index(drop=True)
+    if df.shape[1] >= len(columns):
+        return df.rename(columns=dict(zip(df.columns[:len(columns)], columns))).reset_index(drop=True)
+    raise ValueError(f"Во входном файле должны быть столбцы: {', '.join(columns)}")
+
+
+class ResultWriter:
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.is_excel = file_path.lower().endswith('.xlsx')
+        self._header_written = False
+
+        if self.is_excel:
+            # Книга в режиме write_only не держит строки в памяти
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet("Расчет материалов")
+        else:
+            self._file = open(file_path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+
+    def write(self, frame: pd.DataFrame):
+        if not self._header_written:
+            header = [str(column) for column in frame.columns]
+            (self._sheet.append if self.is_excel else self._writer.writerow)(header)
+            self._header_written = True
+
+        rows = frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+        if self.is_excel:
+            for row in rows:
+                self._sheet.append(row)
+        else:
+            self._writer.writerows(rows)
+
+    def close(self):
+        if self.is_excel:
+            self._workbook.save(self.file_path)
+        else:
+            self._file.close()
+
+
+def run_batch(input_path: str, output_path: str, db_path: str,
+              chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None) -> Dict[str, Any]:
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    rows_count = 0
+    error_counts = np.zeros(len(MaterialCalculator.ERROR_MESSAGES), dtype=np.int64)
+
+    # Проверка базы до создания выходного файла и запуска процессов
+    open_database(db_path).disconnect()
+
+    chunks = (prepare_orders(df) for df in iter_file_chunks(input_path, chunk_size))
+    writer = ResultWriter(output_path)
+
+    def write_result(orders: pd.DataFrame, result: Tuple[np.ndarray, np.ndarray]):
+        nonlocal rows_count
+        orders['material_required'], orders['error_code'] = result
+        writer.write(orders)
+        rows_count += len(orders)
+        error_counts[:] += np.bincount(result[1], minlength=len(error_counts))
+
+    try:
+        if workers > 1:
+            # В работе не больше двух частей на процесс, результаты пишутся в порядке входного файла
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(db_path,)) as executor:
+                pending = deque()
+                for orders in chunks:
+                    pending.append((orders, executor.submit(calculate_chunk, orders)))
+                    if len(pending) >= workers * 2:
+                        orders, future = pending.popleft()
+                        write_result(orders, future.result())
+                while pending:
+                    orders, future = pending.popleft()
+                    write_result(orders, future.result())
+        else:
+            init_worker(db_path)
+            for orders in chunks:
+                write_result(orders, calculate_chunk(orders))
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    errors = {
+        MaterialCalculator.ERROR_MESSAGES[error_code]: int(count)
+        for error_code, count in enumerate(error_counts)
+        if error_code != MaterialCalculator.ERROR_NONE and count
+    }
+    return {
+        'rows': rows_count,
+        'errors': errors,
+        'elapsed': elapsed,
+        'rows_per_second': rows_count / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пакетный расчет материалов по файлу заказов")
+    parser.add_argument('input', help="входной файл заказов (CSV или XLSX)")
+    parser.add_argument('output', help="файл результатов (CSV или XLSX)")
+    parser.add_argument('--db', default="partners_system.db", help="путь к базе данных")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="строк в одной части")
+    parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Файл заказов не найден: {args.input}")
+        return 1
+    if not os.path.exists(args.db):
+        print(f"База данных не найдена: {args.db}")
+        return 1
+    if args.chunk_size <= 0:
+        print("Размер части должен быть положительным")
+        return 1
+
+    try:
+        stats = run_batch(args.input, args.output, args.db, args.chunk_size, args.workers)
+    except Exception as e:
+        print(f"Ошибка пакетного расчета: {e}")
+        return 1
+
+    error_total = sum(stats['errors'].values())
+    print(f"Обработано строк: {stats['rows']} за {stats['elapsed']:.2f} с ({stats['rows_per_second']:.0f} строк/с)")
+    print(f"Строк с ошибками: {error_total}")
+    for message, count in stats['errors'].items():
+        print(f"  {message}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,226 @@
+import re
 import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable, Iterator
+from query_profiler import QueryProfiler
+from migrations import apply_migrations
+from excel_cache import ExcelCache, file_hash, read_excel_cached
+from file_chunks import iter_excel_chunks, iter_file_chunks
+
+
+def read_excel_file(file_path: str, content_hash: Optional[str] = None) -> pd.DataFrame:
+    return read_excel_cached(file_path, content_hash)
+
+
+class NameResolver:
+
+    # Справочники: таблица -> (столбец названия, столбец ID)
+    DIMENSIONS = {
+        'material_types': ('material_type_name', 'material_type_id'),
+        'product_types': ('product_type_name', 'product_type_id'),
+        'partners': ('partner_name', 'partner_id'),
+        'products': ('product_name', 'product_id')
+    }
+
+    def __init__(self, db_manager: 'DatabaseManager'):
+        self.db_manager = db_manager
+        self._maps: Dict[str, Dict[Any, int]] = {}
+        self._last_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def mapping(self, table_name: str) -> Dict[Any, int]:
+        with self._lock:
+            if table_name not in self._maps:
+                self._maps[table_name] = {}
+                self._last_ids[table_name] = 0
+                self._load_new_rows(table_name)
+            return self._maps[table_name]
+
+    def resolve(self, table_name: str, name: Any) -> Optional[int]:
+        return self.mapping(table_name).get(name)
+
+    def resolve_many(self, table_name: str, names: Iterable[Any]) -> List[Optional[int]]:
+        ids = self.mapping(table_name)
+        return [ids.get(name) for name in names]
+
+    def refresh(self, table_name: str):
+        # Дочитывание строк, добавленных после последней загрузки справочника
+        with self._lock:
+            if table_name in self._maps:
+                self._load_new_rows(table_name)
+
+    def invalidate(self, table_name: Optional[str] = None):
+        with self._lock:
+            if table_name is None:
+                self._maps.clear()
+                self._last_ids.clear()
+            else:
+                self._maps.pop(table_name, None)
+                self._last_ids.pop(table_name, None)
+
+    def _load_new_rows(self, table_name: str):
+        name_column, id_column = self.DIMENSIONS[table_name]
+        rows = self.db_manager.fetch_all(
+            f"SELECT {name_column}, {id_column} FROM {table_name} WHERE {id_column} > ? ORDER BY {id_column}",
+            (self._last_ids[table_name],)
+        )
+
+        # При дублирующихся названиях сохраняется наименьший ID
+        ids = self._maps[table_name]
+        for row in rows:
+            ids.setdefault(row[0], row[1])
+        if rows:
+            self._last_ids[table_name] = rows[-1][1]
 
 class DatabaseManager:
+
+    # Файлы ресурсов для импорта
+    IMPORT_FILES = {
+        'material_types': "Material_type_import.xlsx",
+        'product_types': "Product_type_import.xlsx",
+        'products': "Products_import.xlsx",
+        'partners': "Partners_import.xlsx",
+        'partner_products': "Partner_products_import.xlsx"
+    }
+
+    # Размер пакета строк при потоковом импорте
+    IMPORT_CHUNK_SIZE = 5000
+
+    # Размер страницы при постраничной выборке
+    PAGE_SIZE = 200
+
+    # Максимальное количество результатов полнотекстового поиска
+    SEARCH_LIMIT = 500
+
+    # Размер пакета и порог перестроения индексов при загрузке продаж
+    SALES_BATCH_SIZE = 50000
+    SALES_INDEX_REBUILD_BYTES = 20 * 1024 * 1024
+
+    # PRAGMA, применяемые к каждому новому соединению пула
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'temp_store': 'MEMORY',
+        'cache_size': -16000
+    }
+    
+    # Запись в справочники типов увеличивает reference_data_version (кэш MaterialCalculator)
+    REFERENCE_WRITE_PATTERN = re.compile(
+        r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)"
+        r"\s+(?:product_types|material_types)\b",
+        re.IGNORECASE
+    )
     
-    def __init__(self, db_path: str = "partners_system.db"):
+    def __init__(self, db_path: str = "partners_system.db", busy_timeout: float = 5.0,
+                 pragmas: Optional[Dict[str, Any]] = None):
         self.db_path = db_path
-        self.connection = None
+        self.busy_timeout = busy_timeout
+        self.pragmas = dict(self.DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        # Пул соединений: одно соединение на поток
+        self._local = threading.local()
+        self._pool: Dict[int, sqlite3.Connection] = {}
+        self._pool_lock = threading.Lock()
+        self._connected = False
+
+        self.import_stats: Dict[str, Dict[str, float]] = {}
+        # Существующие записи без связи с файлом импорта (на время загрузки листа)
+        self._unlinked_entities: Optional[Dict[str, Dict[str, Any]]] = None
+        self.resolver = NameResolver(self)
+        self.profiler: Optional[QueryProfiler] = None
+        self._full_text_search: Optional[bool] = None
+        self._reference_data_version = 0
+        self._version_lock = threading.Lock()
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        if not self._connected:
+            return None
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._open_connection()
+            self._local.connection = connection
+            with self._pool_lock:
+                self._pool[threading.get_ident()] = connection
+        return connection
+
+    def _open_connection(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
         
     def connect(self) -> bool:
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row
+            self._connected = True
+            self.connection
             return True
         except Exception as e:
+            self._connected = False
             print(f"Ошибка подключения к базе данных: {e}")
             return False
     
     def disconnect(self):
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        self._connected = False
+        with self._pool_lock:
+            connections = list(self._pool.values())
+            self._pool.clear()
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                print(f"Ошибка закрытия соединения: {e}")
+        self._local = threading.local()
+
+    def release_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            return
+        with self._pool_lock:
+            self._pool.pop(threading.get_ident(), None)
+        connection.close()
+        self._local.connection = None
+
+    @property
+    def reference_data_version(self) -> int:
+        return self._reference_data_version
+
+    def bump_reference_data_version(self):
+        with self._version_lock:
+            self._reference_data_version += 1
+
+    def _track_reference_write(self, query: str):
+        if self.REFERENCE_WRITE_PATTERN.match(query):
+            self._local.reference_write_pending = True
+            self.bump_reference_data_version()
+
+    def _finish_reference_write(self):
+        # Повторное увеличение после COMMIT/ROLLBACK: данные, прочитанные внутри транзакции, устаревают
+        if getattr(self._local, 'reference_write_pending', False):
+            self._local.reference_write_pending = False
+            self.bump_reference_data_version()
+
+    def commit(self) -> bool:
+        try:
+            self.connection.commit()
+            self._finish_reference_write()
+            return True
+        except Exception as e:
+            print(f"Ошибка фиксации транзакции: {e}")
+            return False
     
     def create_tables(self) -> bool:
         try:
@@ -32,100 +230,570 @@ class DatabaseManager:
             cursor = self.connection.cursor()
             cursor.executescript(sql_script)
             self.connection.commit()
+
+            apply_migrations(self.connection)
+            restored = self._restore_pending_indexes()
+            if restored:
+                print(f"Восстановлены индексы после прерванной загрузки: {', '.join(restored)}")
             return True
         except Exception as e:
             print(f"Ошибка создания таблиц: {e}")
             return False
     
-    def import_data_from_excel(self, resources_path: str) -> bool:
+    def import_data_from_excel(self, resources_path: str, streaming: bool = False,
+                               chunk_size: int = IMPORT_CHUNK_SIZE, force: bool = False,
+                               parallel: bool = True) -> bool:
         try:
-            material_types_file = os.path.join(resources_path, "Material_type_import.xlsx")
-            if os.path.exists(material_types_file):
-                df = pd.read_excel(material_types_file)
-                for _, row in df.iterrows():
-                    self.execute_query(
-                        "INSERT OR IGNORE INTO material_types (material_type_name, waste_percentage) VALUES (?, ?)",
-                        (row.iloc[0], row.iloc[1] if len(row) > 1 else 0.0)
-                    )
-            
-            product_types_file = os.path.join(resources_path, "Product_type_import.xlsx")
-            if os.path.exists(product_types_file):
-                df = pd.read_excel(product_types_file)
-                for _, row in df.iterrows():
-                    self.execute_query(
-                        "INSERT OR IGNORE INTO product_types (product_type_name, coefficient) VALUES (?, ?)",
-                        (row.iloc[0], row.iloc[1] if len(row) > 1 else 1.0)
-                    )
-            
-            materials_file = os.path.join(resources_path, "Material_type_import.xlsx")
-            if os.path.exists(materials_file):
-                df = pd.read_excel(materials_file)
-                for _, row in df.iterrows():
-                    if len(row) > 2:
-                        material_name = row.iloc[2] if len(row) > 2 else row.iloc[0]
-                        material_type_name = row.iloc[0]
-                        material_type_id = self.get_material_type_id(material_type_name)
-                        if material_type_id:
-                            self.execute_query(
-                                "INSERT OR IGNORE INTO materials (material_name, material_type_id) VALUES (?, ?)",
-                                (material_name, material_type_id)
-                            )
-            
-            products_file = os.path.join(resources_path, "Products_import.xlsx")
-            if os.path.exists(products_file):
-                df = pd.read_excel(products_file)
-                for _, row in df.iterrows():
-                    if len(row) > 1:
-                        product_name = row.iloc[0]
-                        product_type_name = row.iloc[1]
-                        product_type_id = self.get_product_type_id(product_type_name)
-                        if product_type_id:
-                            self.execute_query(
-                                "INSERT OR IGNORE INTO products (product_name, product_type_id) VALUES (?, ?)",
-                                (product_name, product_type_id)
-                            )
-
-            partners_file = os.path.join(resources_path, "Partners_import.xlsx")
-            if os.path.exists(partners_file):
-                df = pd.read_excel(partners_file)
-                for _, row in df.iterrows():
-                    partner_name = row.iloc[0]
-                    contact_person = row.iloc[1] if len(row) > 1 else None
-                    phone = row.iloc[2] if len(row) > 2 else None
-                    email = row.iloc[3] if len(row) > 3 else None
-                    address = row.iloc[4] if len(row) > 4 else None
-                    
-                    self.execute_query(
-                        """INSERT OR IGNORE INTO partners 
-                           (partner_name, contact_person, phone, email, address) 
-                           VALUES (?, ?, ?, ?, ?)""",
-                        (partner_name, contact_person, phone, email, address)
-                    )
+            self.import_stats = {}
+            changed_files = []
+            for key, file_name in self.IMPORT_FILES.items():
+                file_path = os.path.join(resources_path, file_name)
+                if not os.path.exists(file_path):
+                    continue
 
-            partner_products_file = os.path.join(resources_path, "Partner_products_import.xlsx")
-            if os.path.exists(partner_products_file):
-                df = pd.read_excel(partner_products_file)
-                for _, row in df.iterrows():
-                    partner_name = row.iloc[0]
-                    product_name = row.iloc[1]
-                    
-                    partner_id = self.get_partner_id(partner_name)
-                    product_id = self.get_product_id(product_name)
-                    
-                    if partner_id and product_id:
-                        self.execute_query(
-                            "INSERT OR IGNORE INTO partner_products (partner_id, product_id) VALUES (?, ?)",
-                            (partner_id, product_id)
-                        )
+                # Неизменившиеся файлы не разбираются
+                file_state = self._get_changed_file_state(file_name, file_path, force)
+                if file_state is not None:
+                    changed_files.append((key, file_name, file_path, file_state))
+
+            frames = {}
+            if not streaming:
+                frames = self._parse_excel_files(
+                    {file_path: file_state['content_hash'] for _, _, file_path, file_state in changed_files},
+                    parallel
+                )
+
+            sources = {}
+            for key, file_name, file_path, file_state in changed_files:
+                if streaming:
+                    chunks = lambda path=file_path: iter_excel_chunks(path, chunk_size)
+                else:
+                    chunks = lambda df=frames[file_path]: [df]
+                sources[key] = (file_name, file_state, chunks)
+
+            if not sources:
+                print("Нет изменённых файлов ресурсов, импорт пропущен")
+                return True
+
+            with self.transaction():
+                self._bulk_load_sheets(sources, force)
+                self._add_sample_sales_data()
 
-            self._add_sample_sales_data()
-            
-            self.connection.commit()
             return True
             
         except Exception as e:
+            self.resolver.invalidate()
             print(f"Ошибка импорта данных: {e}")
             return False
+
+    def _parse_excel_files(self, file_hashes: Dict[str, str], parallel: bool) -> Dict[str, pd.DataFrame]:
+        # Книги из кэша читаются в этом процессе: столбцы остаются отображенными в память,
+        # и запуск процессов не нужен. Разбор остальных книг не зависит друг от друга
+        # и выполняется в пуле процессов; загрузка в базу затем идет в порядке внешних ключей
+        frames = {}
+        uncached = {}
+        for file_path, content_hash in file_hashes.items():
+            df = ExcelCache.for_file(file_path).load(file_path, content_hash)
+            if df is None:
+                uncached[file_path] = content_hash
+            else:
+                frames[file_path] = df
+
+        file_paths = list(uncached)
+        workers = min(len(file_paths), os.cpu_count() or 1)
+        if parallel and workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    frames.update(zip(file_paths, executor.map(read_excel_file, file_paths, uncached.values())))
+                    return frames
+            except BrokenProcessPool as e:
+                print(f"Параллельный разбор недоступен, файлы будут разобраны последовательно: {e}")
+
+        frames.update((file_path, read_excel_file(file_path, content_hash)) for file_path, content_hash in uncached.items())
+        return frames
+
+    def _get_changed_file_state(self, file_name: str, file_path: str, force: bool) -> Optional[Dict[str, Any]]:
+        stat = os.stat(file_path)
+        manifest = self.fetch_one(
+            "SELECT content_hash, mtime, size, rejected_rows FROM import_manifest WHERE file_name = ?",
+            (file_name,)
+        )
+        # Файл с незагруженными строками разбирается снова: связанные записи могли появиться
+        if manifest and manifest[3]:
+            manifest = None
+        if manifest and not force and manifest[1] == stat.st_mtime and manifest[2] == stat.st_size:
+            return None
+
+        content_hash = file_hash(file_path)
+        file_state = {'content_hash': content_hash, 'mtime': stat.st_mtime, 'size': stat.st_size}
+        if manifest and not force and manifest[0] == content_hash:
+            # Изменилось только время модификации
+            self.execute_query(
+                "UPDATE import_manifest SET mtime = ?, size = ? WHERE file_name = ?",
+                (stat.st_mtime, stat.st_size, file_name)
+            )
+            self.commit()
+            return None
+
+        return file_state
+
+    @staticmethod
+    def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+        # Пропуски (None, NaN, NaT) приводятся к одному значению: кадры из кэша, pd.read_excel
+        # и потокового чтения openpyxl дают одинаковый хэш строки
+        normalized = df.astype(object).where(df.notna(), None)
+        return pd.util.hash_pandas_object(normalized.astype(str), index=False).values.view('int64')
+
+    def _has_manifest_rows(self, file_name: str) -> bool:
+        return self.connection.execute(
+            "SELECT 1 FROM import_manifest_rows WHERE file_name = ? LIMIT 1", (file_name,)
+        ).fetchone() is not None
+
+    def _manifest_rows(self, file_name: str, row_numbers: pd.Index) -> Dict[int, Tuple[int, Optional[int]]]:
+        # Строки манифеста для диапазона номеров строк пакета: номер -> (хэш, ID созданной записи)
+        if not len(row_numbers):
+            return {}
+        return {
+            row[0]: (row[1], row[2]) for row in self.connection.execute(
+                """SELECT row_number, row_hash, entity_id FROM import_manifest_rows
+                   WHERE file_name = ? AND row_number BETWEEN ? AND ?""",
+                (file_name, int(row_numbers[0]), int(row_numbers[-1]))
+            )
+        }
+
+    def _add_manifest_rows(self, file_name: str, row_numbers: pd.Index, row_hashes: np.ndarray,
+                           entity_ids: pd.Series):
+        self._executemany(
+            """INSERT OR REPLACE INTO import_manifest_rows (file_name, row_number, row_hash, entity_id)
+               VALUES (?, ?, ?, ?)""",
+            [
+                (file_name, row_number, row_hash, None if entity_id is None else int(entity_id))
+                for row_number, row_hash, entity_id in zip(row_numbers.tolist(), row_hashes.tolist(), entity_ids.tolist())
+            ]
+        )
+
+    def _save_manifest(self, file_name: str, file_state: Dict[str, Any], rejected_count: int, rows_count: int):
+        # Строки за концом файла больше не связаны с записями; сами записи не удаляются
+        self.connection.execute(
+            "DELETE FROM import_manifest_rows WHERE file_name = ? AND row_number >= ?",
+            (file_name, rows_count)
+        )
+        self.connection.execute(
+            """INSERT INTO import_manifest (file_name, content_hash, mtime, size, rejected_rows, imported_at)
+               VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT(file_name) DO UPDATE SET
+                   content_hash = excluded.content_hash,
+                   mtime = excluded.mtime,
+                   size = excluded.size,
+                   rejected_rows = excluded.rejected_rows,
+                   imported_at = excluded.imported_at""",
+            (file_name, file_state['content_hash'], file_state['mtime'], file_state['size'], rejected_count)
+        )
+
+    def _bulk_load_sheets(self, sources: Dict[str, Tuple[str, Dict[str, Any], Callable[[], Iterable[pd.DataFrame]]]],
+                          force: bool = False):
+        # Порядок листов соответствует внешним ключам; лист типов материалов загружает и материалы
+        sheet_loaders = [
+            ('material_types', [('material_types', self._load_material_types), ('materials', self._load_materials)]),
+            ('product_types', [('product_types', self._load_product_types)]),
+            ('products', [('products', self._load_products)]),
+            ('partners', [('partners', self._load_partners)]),
+            ('partner_products', [('partner_products', self._load_partner_products)])
+        ]
+
+        for sheet_key, loaders in sheet_loaders:
+            source = sources.get(sheet_key)
+            if source is None:
+                continue
+
+            file_name, file_state, chunks = source
+            rows_counts = {table_name: 0 for table_name, _ in loaders}
+            elapsed = {table_name: 0.0 for table_name, _ in loaders}
+            rejected_count = 0
+            row_number = 0
+
+            # Файл без связей в манифесте (первый импорт или база до миграции 7):
+            # новые строки сначала сопоставляются с совпадающими существующими записями
+            self._unlinked_entities = None if self._has_manifest_rows(file_name) else {}
+            try:
+                for df in chunks():
+                    # Номер строки файла - индекс кадра; пустые строки не нумеруются в обоих режимах чтения
+                    df = df.dropna(how='all').reset_index(drop=True)
+                    df.index += row_number
+                    row_number += len(df)
+
+                    # Дальше передаются только новые или изменённые строки; force применяет все строки заново
+                    row_hashes = self._row_hashes(df)
+                    manifest = self._manifest_rows(file_name, df.index)
+                    entries = [manifest.get(number, (None, None)) for number in df.index.tolist()]
+                    changed = np.array([
+                        force or entry[0] != row_hash for entry, row_hash in zip(entries, row_hashes.tolist())
+                    ], dtype=bool)
+                    if not changed.any():
+                        continue
+
+                    entity_ids = pd.Series([entry[1] for entry in entries], index=df.index, dtype=object)
+                    rejected = pd.Index([], dtype='int64')
+                    for table_name, loader in loaders:
+                        started = time.perf_counter()
+                        rows_count, loader_rejected, created_ids = loader(df[changed], entity_ids[changed])
+                        elapsed[table_name] += time.perf_counter() - started
+                        rows_counts[table_name] += rows_count
+                        rejected = rejected.union(loader_rejected)
+                        entity_ids.update(created_ids)
+
+                    # В манифест попадают только записанные строки, отклоненные повторятся при следующем импорте
+                    written = changed & ~df.index.isin(rejected)
+                    self._add_manifest_rows(file_name, df.index[written], row_hashes[written], entity_ids[written])
+                    rejected_count += len(rejected)
+            finally:
+                self._unlinked_entities = None
+
+            for table_name, _ in loaders:
+                self._record_import_stats(table_name, rows_counts[table_name], elapsed[table_name])
+            if rejected_count:
+                print(f"{file_name}: не загружено строк с пустым названием или без связанных записей: {rejected_count}")
+            self._save_manifest(file_name, file_state, rejected_count, row_number)
+
+    def _record_import_stats(self, table_name: str, rows_count: int, elapsed: float):
+        rows_per_second = rows_count / elapsed if elapsed > 0 else float(rows_count)
+        self.import_stats[table_name] = {
+            'rows': rows_count,
+            'seconds': elapsed,
+            'rows_per_second': rows_per_second
+        }
+        print(f"Импорт {table_name}: {rows_count} строк за {elapsed:.3f} с ({rows_per_second:,.0f} строк/с)")
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection
+        if not connection.in_transaction:
+            connection.execute("BEGIN")
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            self._finish_reference_write()
+
+    def _executemany(self, query: str, rows: List[tuple]) -> int:
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        self.connection.executemany(query, rows)
+        self._profile(query, (), started, len(rows))
+        self._track_reference_write(query)
+        return len(rows)
+
+    @staticmethod
+    def _frame_to_rows(df: pd.DataFrame) -> List[tuple]:
+        # Преобразование в объекты Python: NaN -> None, numpy.int64 -> int
+        df = df.astype(object).where(pd.notna(df), None)
+        return list(df.itertuples(index=False, name=None))
+
+    def _write_entities(self, table_name: str, id_column: str, frame: pd.DataFrame,
+                        entity_ids: pd.Series) -> Tuple[int, pd.Series]:
+        # Строки со связью из манифеста обновляют свою запись, остальные добавляются.
+        # Возвращает число записанных строк и ID записей, созданных или сопоставленных для новых строк
+        columns = list(frame.columns)
+        linked_ids = entity_ids.reindex(frame.index)
+        linked = linked_ids.notna().to_numpy()
+
+        updated_count = self._executemany(
+            f"UPDATE {table_name} SET {', '.join(f'{column} = ?' for column in columns)} WHERE {id_column} = ?",
+            self._frame_to_rows(frame[linked].assign(entity_id=linked_ids[linked]))
+        )
+
+        new_rows = frame[~linked]
+        new_ids = pd.Series([None] * len(new_rows), index=new_rows.index, dtype=object)
+        if self._unlinked_entities is not None and len(new_rows):
+            new_ids.update(self._match_unlinked_entities(table_name, id_column, columns, new_rows))
+            updated_count += int(new_ids.notna().sum())
+            new_rows = new_rows[new_ids.isna().to_numpy()]
+
+        # ID AUTOINCREMENT возрастают, поэтому добавленные записи - это записи с ID больше прежнего максимума
+        last_id = self.connection.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {table_name}").fetchone()[0]
+        inserted_count = self._executemany(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            self._frame_to_rows(new_rows)
+        )
+        inserted_ids = [row[0] for row in self.connection.execute(
+            f"SELECT {id_column} FROM {table_name} WHERE {id_column} > ? ORDER BY {id_column}", (last_id,)
+        )]
+        if len(inserted_ids) != inserted_count:
+            raise RuntimeError(f"Не удалось сопоставить добавленные записи {table_name} со строками файла")
+        new_ids.update(pd.Series(inserted_ids, index=new_rows.index, dtype=object))
+
+        if updated_count and table_name in NameResolver.DIMENSIONS:
+            self.resolver.invalidate(table_name)
+        return updated_count + inserted_count, new_ids
+
+    def _match_unlinked_entities(self, table_name: str, id_column: str, columns: List[str],
+                                 frame: pd.DataFrame) -> pd.Series:
+        # Запись, еще не связанная со строкой файла, считается созданной этой строкой: сначала
+        # по совпадению всех значений, затем по названию (строка изменилась после прошлого импорта).
+        # Каждая запись сопоставляется не более одного раза, в порядке ID
+        entities = self._unlinked_entities.get(table_name)
+        if entities is None:
+            entities = {'values': {}, 'names': {}, 'matched': set()}
+            for row in self.connection.execute(
+                f"SELECT {id_column}, {', '.join(columns)} FROM {table_name} ORDER BY {id_column} DESC"
+            ):
+                key = self._entity_key(row[1:])
+                entities['values'].setdefault(key, []).append(row[0])
+                entities['names'].setdefault(key[0], []).append(row[0])
+            self._unlinked_entities[table_name] = entities
+
+        keys = [self._entity_key(values) for values in self._frame_to_rows(frame)]
+        matched_ids = [self._pop_unmatched(entities['values'].get(key), entities['matched']) for key in keys]
+        matched_ids = [
+            entity_id if entity_id is not None else self._pop_unmatched(entities['names'].get(key[0]), entities['matched'])
+            for entity_id, key in zip(matched_ids, keys)
+        ]
+        return pd.Series(matched_ids, index=frame.index, dtype=object)
+
+    @staticmethod
+    def _pop_unmatched(ids: Optional[List[int]], matched: set) -> Optional[int]:
+        while ids:
+            entity_id = ids.pop()
+            if entity_id not in matched:
+                matched.add(entity_id)
+                return entity_id
+        return None
+
+    @staticmethod
+    def _entity_key(values: Iterable[Any]) -> tuple:
+        # Значения сравниваются как текст: TEXT-столбцы хранят числа из Excel строками
+        return tuple(None if value is None else str(value) for value in values)
+
+    @staticmethod
+    def _no_entities(df: pd.DataFrame) -> pd.Series:
+        return pd.Series([], index=df.index[:0], dtype=object)
+
+    def _load_material_types(self, df: pd.DataFrame, entity_ids: pd.Series) -> Tuple[int, pd.Index, pd.Series]:
+        # Строки без названия отклоняются: ошибка NOT NULL в executemany отменила бы весь импорт
+        frame = pd.DataFrame({
+            'name': df.iloc[:, 0],
+            'waste': df.iloc[:, 1] if df.shape[1] > 1 else 0.0
+        }).dropna(subset=['name'])
+        frame['waste'] = frame['waste'].fillna(0.0)
+
+        # Названия типов уникальны: строка файла связана с типом по названию
+        rows_count = self._executemany(
+            """INSERT INTO material_types (material_type_name, waste_percentage) VALUES (?, ?)
+               ON CONFLICT(material_type_name) DO UPDATE SET waste_percentage = excluded.waste_percentage""",
+            self._frame_to_rows(frame)
+        )
+        self.resolver.refresh('material_types')
+        return rows_count, df.index.difference(frame.index), self._no_entities(df)
+
+    def _load_product_types(self, df: pd.DataFrame, entity_ids: pd.Series) -> Tuple[int, pd.Index, pd.Series]:
+        frame = pd.DataFrame({
+            'name': df.iloc[:, 0],
+            'coefficient': df.iloc[:, 1] if df.shape[1] > 1 else 1.0
+        }).dropna(subset=['name'])
+        frame['coefficient'] = frame['coefficient'].fillna(1.0)
+        rows_count = self._executemany(
+            """INSERT INTO product_types (product_type_name, coefficient) VALUES (?, ?)
+               ON CONFLICT(product_type_name) DO UPDATE SET coefficient = excluded.coefficient""",
+            self._frame_to_rows(frame)
+        )
+        self.resolver.refresh('product_types')
+        return rows_count, df.index.difference(frame.index), self._no_entities(df)
+
+    def _load_materials(self, df: pd.DataFrame, entity_ids: pd.Series) -> Tuple[int, pd.Index, pd.Series]:
+        # Возвращает число записанных строк, индексы строк, отклоненных из-за внешних ключей,
+        # и ID созданных записей; строка типа без названия материала не описывает материал
+        if df.shape[1] <= 2:
+            return 0, df.index[:0], self._no_entities(df)
+
+        type_ids = self.resolver.mapping('material_types')
+        frame = pd.DataFrame({
+            'material_name': df.iloc[:, 2],
+            'material_type_id': df.iloc[:, 0].map(type_ids)
+        }).dropna(subset=['material_name', 'material_type_id'])
+        frame['material_type_id'] = frame['material_type_id'].astype('int64')
+
+        # Названия материалов не уникальны: запись находится по связи строки файла в манифесте
+        rows_count, created_ids = self._write_entities('materials', 'material_id', frame, entity_ids)
+        return rows_count, df.index[df.iloc[:, 2].notna()].difference(frame.index), created_ids
+
+    def _load_products(self, df: pd.DataFrame, entity_ids: pd.Series) -> Tuple[int, pd.Index, pd.Series]:
+        if df.shape[1] <= 1:
+            return 0, df.index[:0], self._no_entities(df)
+
+        type_ids = self.resolver.mapping('product_types')
+        frame = pd.DataFrame({
+            'product_name': df.iloc[:, 0],
+            'product_type_id': df.iloc[:, 1].map(type_ids)
+        }).dropna(subset=['product_name', 'product_type_id'])
+        frame['product_type_id'] = frame['product_type_id'].astype('int64')
+
+        rows_count, created_ids = self._write_entities('products', 'product_id', frame, entity_ids)
+        self.resolver.refresh('products')
+        return rows_count, df.index.difference(frame.index), created_ids
+
+    def _load_partners(self, df: pd.DataFrame, entity_ids: pd.Series) -> Tuple[int, pd.Index, pd.Series]:
+        columns = ['partner_name', 'contact_person', 'phone', 'email', 'address']
+        frame = pd.DataFrame({
+            column: df.iloc[:, index] if df.shape[1] > index else None
+            for index, column in enumerate(columns)
+        }).dropna(subset=['partner_name'])
+
+        # Разные партнеры могут иметь одно название: изменённая строка файла обновляет
+        # партнера, созданного ею при прошлом импорте
+        rows_count, created_ids = self._write_entities('partners', 'partner_id', frame, entity_ids)
+        self.resolver.refresh('partners')
+        return rows_count, df.index.difference(frame.index), created_ids
+
+    def _load_partner_products(self, df: pd.DataFrame, entity_ids: pd.Series) -> Tuple[int, pd.Index, pd.Series]:
+        # Пара партнер-продукт уникальна, повторная строка игнорируется
+        partner_ids = self.resolver.mapping('partners')
+        product_ids = self.resolver.mapping('products')
+        frame = pd.DataFrame({
+            'partner_id': df.iloc[:, 0].map(partner_ids),
+            'product_id': df.iloc[:, 1].map(product_ids)
+        }).dropna()
+        rows_count = self._executemany(
+            "INSERT OR IGNORE INTO partner_products (partner_id, product_id) VALUES (?, ?)",
+            self._frame_to_rows(frame.astype('int64'))
+        )
+        return rows_count, df.index.difference(frame.index), self._no_entities(df)
+    
+    def import_sales_file(self, file_path: str, batch_size: int = SALES_BATCH_SIZE,
+                          rebuild_indexes: Optional[bool] = None,
+                          date_format: Optional[str] = None) -> Dict[str, Any]:
+        # Колонки файла: партнер (название или ID), продукт (название или ID), количество, дата продажи.
+        # date_format - формат даты strftime; без него читаются ISO и дд.мм.гггг
+        if rebuild_indexes is None:
+            rebuild_indexes = os.path.getsize(file_path) >= self.SALES_INDEX_REBUILD_BYTES
+
+        started = time.perf_counter()
+        loaded_count = 0
+        rejected_count = 0
+        bad_date_count = 0
+        known_ids = {}
+        self._restore_pending_indexes()
+        if rebuild_indexes:
+            self._drop_secondary_indexes('sales')
+
+        try:
+            trigger_sql = self.fetch_one(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_sales_insert_summary'"
+            )
+            for df in iter_file_chunks(file_path, batch_size):
+                frame, chunk_bad_dates = self._prepare_sales_chunk(df, known_ids, date_format)
+                rejected_count += len(df) - len(frame)
+                bad_date_count += chunk_bad_dates
+                loaded_count += self._load_sales_chunk(frame, trigger_sql[0] if trigger_sql else None)
+        finally:
+            if rebuild_indexes:
+                self._restore_pending_indexes()
+
+        self._record_import_stats('sales', loaded_count, time.perf_counter() - started)
+        stats = dict(self.import_stats['sales'])
+        stats['rejected'] = rejected_count
+        stats['rejected_dates'] = bad_date_count
+        if rejected_count:
+            print(f"Отклонено строк продаж: {rejected_count}, из них с некорректной датой: {bad_date_count}")
+        return stats
+
+    def _resolve_sales_ids(self, table_name: str, column: pd.Series, known_ids: Dict[str, set]) -> pd.Series:
+        if not pd.api.types.is_numeric_dtype(column):
+            return column.map(self.resolver.mapping(table_name))
+
+        if table_name not in known_ids:
+            id_column = NameResolver.DIMENSIONS[table_name][1]
+            known_ids[table_name] = {row[0] for row in self.fetch_all(f"SELECT {id_column} FROM {table_name}")}
+        return column.where(column.isin(known_ids[table_name]))
+
+    @staticmethod
+    def _parse_sale_dates(column: pd.Series, date_format: Optional[str]) -> pd.Series:
+        if date_format:
+            return pd.to_datetime(column, format=date_format, errors='coerce')
+
+        # Сначала ISO (yyyy-mm-dd), остальное - с днем впереди, как принято в русских файлах
+        dates = pd.to_datetime(column, format='ISO8601', errors='coerce')
+        retry = dates.isna() & column.notna()
+        if retry.any():
+            dates[retry] = pd.to_datetime(column[retry].astype(str), format='mixed', dayfirst=True, errors='coerce')
+        return dates
+
+    def _prepare_sales_chunk(self, df: pd.DataFrame, known_ids: Dict[str, set],
+                             date_format: Optional[str] = None) -> Tuple[pd.DataFrame, int]:
+        # Возвращает подготовленные строки и число строк, отклоненных из-за даты
+        dates = self._parse_sale_dates(df.iloc[:, 3], date_format)
+        frame = pd.DataFrame({
+            'partner_id': self._resolve_sales_ids('partners', df.iloc[:, 0], known_ids),
+            'product_id': self._resolve_sales_ids('products', df.iloc[:, 1], known_ids),
+            'quantity': pd.to_numeric(df.iloc[:, 2], errors='coerce'),
+            'sale_date': dates.dt.strftime('%Y-%m-%d')
+        })
+        bad_date_count = int(frame['sale_date'].isna().sum())
+        frame = frame.dropna()
+        frame = frame[frame['quantity'] > 0]
+        return frame.astype({'partner_id': 'int64', 'product_id': 'int64', 'quantity': 'int64'}), bad_date_count
+
+    def _load_sales_chunk(self, frame: pd.DataFrame, trigger_sql: Optional[str]) -> int:
+        if frame.empty:
+            return 0
+
+        # Построчный триггер заменяется одним агрегированным обновлением сводной таблицы на пакет
+        with self.transaction() as connection:
+            if trigger_sql:
+                connection.execute("DROP TRIGGER IF EXISTS trg_sales_insert_summary")
+
+            rows_count = self._executemany(
+                "INSERT INTO sales (partner_id, product_id, quantity, sale_date) VALUES (?, ?, ?, ?)",
+                self._frame_to_rows(frame[['partner_id', 'product_id', 'quantity', 'sale_date']])
+            )
+
+            totals = frame.groupby('partner_id')['quantity'].agg(['sum', 'count']).reset_index()
+            self._executemany(
+                """INSERT INTO partner_sales_summary (partner_id, total_quantity, sale_count)
+                   VALUES (?, ?, ?)
+                   ON CONFLICT(partner_id) DO UPDATE SET
+                       total_quantity = total_quantity + excluded.total_quantity,
+                       sale_count = sale_count + excluded.sale_count""",
+                self._frame_to_rows(totals)
+            )
+
+            if trigger_sql:
+                connection.execute(trigger_sql)
+
+        return rows_count
+
+    def _drop_secondary_indexes(self, table_name: str) -> List[str]:
+        # DDL удаляемых индексов сохраняется в той же транзакции: если процесс прервется
+        # до восстановления, индексы будут созданы заново при следующем create_tables
+        with self.transaction() as connection:
+            indexes = connection.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table_name,)
+            ).fetchall()
+            for index in indexes:
+                connection.execute(
+                    "INSERT OR REPLACE INTO pending_indexes (index_name, table_name, sql) VALUES (?, ?, ?)",
+                    (index[0], table_name, index[1])
+                )
+                connection.execute(f"DROP INDEX IF EXISTS {index[0]}")
+        return [index[0] for index in indexes]
+
+    def _restore_pending_indexes(self) -> List[str]:
+        restored = []
+        with self.transaction() as connection:
+            pending = connection.execute("SELECT index_name, sql FROM pending_indexes").fetchall()
+            for index_name, index_sql in pending:
+                exists = connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,)
+                ).fetchone()
+                if not exists:
+                    connection.execute(index_sql)
+                    restored.append(index_name)
+            connection.execute("DELETE FROM pending_indexes")
+        return restored
     
     def _add_sample_sales_data(self):
         try:
@@ -147,62 +815,65 @@ class DatabaseManager:
             print(f"Ошибка добавления тестовых данных продаж: {e}")
     
     def get_material_type_id(self, material_type_name: str) -> Optional[int]:
-        result = self.fetch_one(
-            "SELECT material_type_id FROM material_types WHERE material_type_name = ?",
-            (material_type_name,)
-        )
-        return result[0] if result else None
+        return self.resolver.resolve('material_types', material_type_name)
     
     def get_product_type_id(self, product_type_name: str) -> Optional[int]:
-        result = self.fetch_one(
-            "SELECT product_type_id FROM product_types WHERE product_type_name = ?",
-            (product_type_name,)
-        )
-        return result[0] if result else None
+        return self.resolver.resolve('product_types', product_type_name)
     
     def get_partner_id(self, partner_name: str) -> Optional[int]:
-        result = self.fetch_one(
-            "SELECT partner_id FROM partners WHERE partner_name = ?",
-            (partner_name,)
-        )
-        return result[0] if result else None
+        return self.resolver.resolve('partners', partner_name)
     
     def get_product_id(self, product_name: str) -> Optional[int]:
-        result = self.fetch_one(
-            "SELECT product_id FROM products WHERE product_name = ?",
-            (product_name,)
-        )
-        return result[0] if result else None
+        return self.resolver.resolve('products', product_name)
     
+    def enable_profiling(self, slow_query_threshold: float = 0.1, report_on_exit: bool = True) -> QueryProfiler:
+        self.profiler = QueryProfiler(slow_query_threshold, report_on_exit)
+        return self.profiler
+
+    def _profile(self, query: str, params: tuple, started: float, rows: int, failed: bool = False):
+        if self.profiler is not None:
+            self.profiler.record(self.connection, query, params, time.perf_counter() - started, rows, failed)
+
     def execute_query(self, query: str, params: tuple = ()) -> bool:
+        started = time.perf_counter()
         try:
             cursor = self.connection.cursor()
             cursor.execute(query, params)
+            self._profile(query, params, started, cursor.rowcount)
+            self._track_reference_write(query)
             return True
         except Exception as e:
+            self._profile(query, params, started, 0, failed=True)
             print(f"Ошибка выполнения запроса: {e}")
             return False
     
     def fetch_one(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        started = time.perf_counter()
         try:
             cursor = self.connection.cursor()
             cursor.execute(query, params)
-            return cursor.fetchone()
+            result = cursor.fetchone()
+            self._profile(query, params, started, 1 if result else 0)
+            return result
         except Exception as e:
+            self._profile(query, params, started, 0, failed=True)
             print(f"Ошибка получения данных: {e}")
             return None
     
     def fetch_all(self, query: str, params: tuple = ()) -> List[tuple]:
+        started = time.perf_counter()
         try:
             cursor = self.connection.cursor()
             cursor.execute(query, params)
-            return cursor.fetchall()
+            results = cursor.fetchall()
+            self._profile(query, params, started, len(results))
+            return results
         except Exception as e:
+            self._profile(query, params, started, 0, failed=True)
             print(f"Ошибка получения данных: {e}")
             return []
     
-    def get_partners_list(self) -> List[Dict[str, Any]]:
-        query = """
+    PARTNERS_QUERY = """
         SELECT 
             p.partner_id,
             p.partner_name,
@@ -211,39 +882,13 @@ class DatabaseManager:
             p.email,
             p.address,
             p.registration_date,
-            COALESCE(SUM(s.quantity), 0) as total_sales,
-            CASE 
-                WHEN COALESCE(SUM(s.quantity), 0) < 10000 THEN 0
-                WHEN COALESCE(SUM(s.quantity), 0) < 50000 THEN 5
-                WHEN COALESCE(SUM(s.quantity), 0) < 300000 THEN 10
-                ELSE 15
-            END as discount_percentage
+            COALESCE(ss.total_quantity, 0) as total_sales,
+            COALESCE(ss.discount_percentage, 0) as discount_percentage
         FROM partners p
-        LEFT JOIN sales s ON p.partner_id = s.partner_id
-        GROUP BY p.partner_id
-        ORDER BY p.partner_name
+        LEFT JOIN partner_sales_summary ss ON p.partner_id = ss.partner_id
         """
-        
-        results = self.fetch_all(query)
-        partners = []
-        
-        for row in results:
-            partners.append({
-                'partner_id': row[0],
-                'partner_name': row[1],
-                'contact_person': row[2],
-                'phone': row[3],
-                'email': row[4],
-                'address': row[5],
-                'registration_date': row[6],
-                'total_sales': row[7],
-                'discount_percentage': row[8]
-            })
-        
-        return partners
-    
-    def get_partner_sales_history(self, partner_id: int) -> List[Dict[str, Any]]:
-        query = """
+
+    SALES_HISTORY_QUERY = """
         SELECT 
             s.sale_id,
             p.product_name,
@@ -252,21 +897,221 @@ class DatabaseManager:
         FROM sales s
         JOIN products p ON s.product_id = p.product_id
         WHERE s.partner_id = ?
-        ORDER BY s.sale_date DESC
         """
-        
-        results = self.fetch_all(query, (partner_id,))
-        sales_history = []
-        
-        for row in results:
-            sales_history.append({
-                'sale_id': row[0],
-                'product_name': row[1],
-                'quantity': row[2],
-                'sale_date': row[3]
-            })
-        
-        return sales_history
+
+    # Поля, по которым допускается сортировка страниц: SQL-выражение и значение вместо NULL.
+    # Сортировка загруженных записей в интерфейсе использует те же значения
+    PARTNER_SORT_COLUMNS = {
+        'partner_id': ('p.partner_id', 0),
+        'partner_name': ('p.partner_name', ''),
+        'contact_person': ("COALESCE(p.contact_person, '')", ''),
+        'phone': ("COALESCE(p.phone, '')", ''),
+        'email': ("COALESCE(p.email, '')", ''),
+        'address': ("COALESCE(p.address, '')", ''),
+        'registration_date': ("COALESCE(p.registration_date, '')", ''),
+        'total_sales': ('COALESCE(ss.total_quantity, 0)', 0),
+        'discount_percentage': ('COALESCE(ss.discount_percentage, 0)', 0)
+    }
+
+    SALES_SORT_COLUMNS = {
+        'sale_id': ('s.sale_id', 0),
+        'product_name': ('p.product_name', ''),
+        'quantity': ('s.quantity', 0),
+        'sale_date': ('s.sale_date', '')
+    }
+
+    @staticmethod
+    def sort_value(record: Dict[str, Any], field: str, columns: Dict[str, Tuple[str, Any]]) -> Any:
+        value = record[field]
+        return columns[field][1] if value is None else value
+
+    @staticmethod
+    def _keyset_order(columns: Dict[str, Tuple[str, Any]], order_by: List[Tuple[str, bool]],
+                      tie_breaker: Tuple[str, bool], cursor: Optional[tuple]) -> Tuple[str, str, list]:
+        # Keyset-пагинация по произвольному набору полей с разными направлениями:
+        # (a > ?) OR (a = ? AND b < ?) OR ... с уникальным полем в конце
+        keys = []
+        for field, descending in order_by:
+            if field not in columns:
+                raise ValueError(f"Недопустимое поле сортировки: {field}")
+            keys.append((columns[field][0], descending))
+        keys.append(tie_breaker)
+
+        order_sql = ", ".join(f"{expression} {'DESC' if descending else 'ASC'}" for expression, descending in keys)
+        if cursor is None:
+            return "", order_sql, []
+
+        conditions = []
+        params = []
+        for index, (expression, descending) in enumerate(keys):
+            parts = [f"{keys[previous][0]} = ?" for previous in range(index)]
+            parts.append(f"{expression} {'<' if descending else '>'} ?")
+            conditions.append("(" + " AND ".join(parts) + ")")
+            params.extend(cursor[:index + 1])
+        return "(" + " OR ".join(conditions) + ")", order_sql, params
+
+    @staticmethod
+    def _partner_row_to_dict(row) -> Dict[str, Any]:
+        return {
+            'partner_id': row[0],
+            'partner_name': row[1],
+            'contact_person': row[2],
+            'phone': row[3],
+            'email': row[4],
+            'address': row[5],
+            'registration_date': row[6],
+            'total_sales': row[7],
+            'discount_percentage': row[8]
+        }
+
+    @staticmethod
+    def _sale_row_to_dict(row) -> Dict[str, Any]:
+        return {
+            'sale_id': row[0],
+            'product_name': row[1],
+            'quantity': row[2],
+            'sale_date': row[3]
+        }
+
+    def get_partners_list(self) -> List[Dict[str, Any]]:
+        query = self.PARTNERS_QUERY + "ORDER BY p.partner_name, p.partner_id"
+        return [self._partner_row_to_dict(row) for row in self.fetch_all(query)]
+
+    def get_partners_page(self, cursor: Optional[tuple] = None, page_size: Optional[int] = PAGE_SIZE,
+                          order_by: Optional[List[Tuple[str, bool]]] = None) -> Tuple[List[Dict[str, Any]], Optional[tuple]]:
+        # page_size=None - все записи после cursor одним запросом
+        if order_by:
+            return self._get_partners_page_ordered(cursor, page_size, order_by)
+
+        # Keyset-пагинация по (partner_name, partner_id) с использованием idx_partners_name
+        limit = -1 if page_size is None else page_size
+        if cursor is None:
+            query = self.PARTNERS_QUERY + "ORDER BY p.partner_name, p.partner_id LIMIT ?"
+            params = (limit,)
+        else:
+            query = self.PARTNERS_QUERY + """WHERE (p.partner_name, p.partner_id) > (?, ?)
+        ORDER BY p.partner_name, p.partner_id LIMIT ?"""
+            params = (cursor[0], cursor[1], limit)
+
+        partners = [self._partner_row_to_dict(row) for row in self.fetch_all(query, params)]
+        next_cursor = None
+        if len(partners) == page_size:
+            next_cursor = (partners[-1]['partner_name'], partners[-1]['partner_id'])
+        return partners, next_cursor
+
+    def _get_partners_page_ordered(self, cursor: Optional[tuple], page_size: Optional[int],
+                                   order_by: List[Tuple[str, bool]]) -> Tuple[List[Dict[str, Any]], Optional[tuple]]:
+        # Для большинства полей индекса нет, и каждая страница - полная сортировка таблицы:
+        # остаток списка выгоднее получать одним запросом (page_size=None)
+        where_sql, order_sql, params = self._keyset_order(
+            self.PARTNER_SORT_COLUMNS, order_by, ('p.partner_id', False), cursor
+        )
+        query = self.PARTNERS_QUERY
+        if where_sql:
+            query += f"WHERE {where_sql}\n"
+        query += f"ORDER BY {order_sql} LIMIT ?"
+
+        limit = -1 if page_size is None else page_size
+        partners = [self._partner_row_to_dict(row) for row in self.fetch_all(query, tuple(params) + (limit,))]
+        next_cursor = None
+        if len(partners) == page_size:
+            last = partners[-1]
+            next_cursor = tuple(
+                self.sort_value(last, field, self.PARTNER_SORT_COLUMNS) for field, _ in order_by
+            ) + (last['partner_id'],)
+        return partners, next_cursor
+    
+    def has_full_text_search(self) -> bool:
+        if self._full_text_search is None:
+            result = self.fetch_one("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'partners_fts'")
+            self._full_text_search = result is not None
+        return self._full_text_search
+
+    @staticmethod
+    def _build_fts_query(search_text: str) -> str:
+        # Каждое слово ищется по префиксу, все слова должны присутствовать
+        terms = []
+        for word in search_text.split():
+            terms.append('"' + word.replace('"', '""') + '"*')
+        return " ".join(terms)
+
+    def search_partners(self, search_text: str, limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        fts_query = self._build_fts_query(search_text)
+        if not fts_query:
+            return []
+
+        query = self.PARTNERS_QUERY + """JOIN partners_fts ON partners_fts.rowid = p.partner_id
+        WHERE partners_fts MATCH ?
+        ORDER BY partners_fts.rank, p.partner_name
+        LIMIT ?"""
+        return [self._partner_row_to_dict(row) for row in self.fetch_all(query, (fts_query, limit))]
+
+    def get_partner_sales_history(self, partner_id: int) -> List[Dict[str, Any]]:
+        query = self.SALES_HISTORY_QUERY + "ORDER BY s.sale_date DESC, s.sale_id DESC"
+        return [self._sale_row_to_dict(row) for row in self.fetch_all(query, (partner_id,))]
+
+    def get_partner_sales_history_page(self, partner_id: int, cursor: Optional[tuple] = None,
+                                       page_size: int = PAGE_SIZE,
+                                       order_by: Optional[List[Tuple[str, bool]]] = None) -> Tuple[List[Dict[str, Any]], Optional[tuple]]:
+        if order_by:
+            return self._get_partner_sales_history_page_ordered(partner_id, cursor, page_size, order_by)
+
+        # Keyset-пагинация по (sale_date DESC, sale_id DESC) с использованием idx_sales_partner_history
+        if cursor is None:
+            query = self.SALES_HISTORY_QUERY + "ORDER BY s.sale_date DESC, s.sale_id DESC LIMIT ?"
+            params = (partner_id, page_size)
+        else:
+            query = self.SALES_HISTORY_QUERY + """AND (s.sale_date, s.sale_id) < (?, ?)
+        ORDER BY s.sale_date DESC, s.sale_id DESC LIMIT ?"""
+            params = (partner_id, cursor[0], cursor[1], page_size)
+
+        sales_history = [self._sale_row_to_dict(row) for row in self.fetch_all(query, params)]
+        next_cursor = None
+        if len(sales_history) == page_size:
+            next_cursor = (sales_history[-1]['sale_date'], sales_history[-1]['sale_id'])
+        return sales_history, next_cursor
+
+    def _get_partner_sales_history_page_ordered(self, partner_id: int, cursor: Optional[tuple], page_size: int,
+                                                order_by: List[Tuple[str, bool]]) -> Tuple[List[Dict[str, Any]], Optional[tuple]]:
+        where_sql, order_sql, params = self._keyset_order(
+            self.SALES_SORT_COLUMNS, order_by, ('s.sale_id', True), cursor
+        )
+        query = self.SALES_HISTORY_QUERY
+        if where_sql:
+            query += f"AND {where_sql}\n"
+        query += f"ORDER BY {order_sql} LIMIT ?"
+
+        sales_history = [
+            self._sale_row_to_dict(row) for row in self.fetch_all(query, (partner_id, *params, page_size))
+        ]
+        next_cursor = None
+        if len(sales_history) == page_size:
+            last = sales_history[-1]
+            next_cursor = tuple(
+                self.sort_value(last, field, self.SALES_SORT_COLUMNS) for field, _ in order_by
+            ) + (last['sale_id'],)
+        return sales_history, next_cursor
+
+    def iter_partner_sales_history(self, partner_id: int, page_size: int = PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        cursor = None
+        while True:
+            page, cursor = self.get_partner_sales_history_page(partner_id, cursor, page_size)
+            yield from page
+            if cursor is None:
+                break
+
+    def get_partner_sales_summary(self, partner_id: int) -> Dict[str, Any]:
+        result = self.fetch_one(
+            "SELECT total_quantity, sale_count, discount_percentage FROM partner_sales_summary WHERE partner_id = ?",
+            (partner_id,)
+        )
+        if not result:
+            return {'total_quantity': 0, 'sale_count': 0, 'discount_percentage': 0}
+        return {
+            'total_quantity': result[0],
+            'sale_count': result[1],
+            'discount_percentage': result[2]
+        }
     
     def add_partner(self, partner_data: Dict[str, Any]) -> bool:
         query = """
@@ -282,7 +1127,11 @@ class DatabaseManager:
             partner_data.get('address')
         )
         
-        return self.execute_query(query, params)
+        if not (self.execute_query(query, params) and self.commit()):
+            return False
+
+        self.resolver.refresh('partners')
+        return True
     
     def update_partner(self, partner_id: int, partner_data: Dict[str, Any]) -> bool:
         query = """
@@ -300,10 +1149,18 @@ class DatabaseManager:
             partner_id
         )
         
-        return self.execute_query(query, params)
+        if not (self.execute_query(query, params) and self.commit()):
+            return False
+
+        self.resolver.invalidate('partners')
+        return True
     
     def delete_partner(self, partner_id: int) -> bool:
         self.execute_query("DELETE FROM partner_products WHERE partner_id = ?", (partner_id,))
         self.execute_query("DELETE FROM sales WHERE partner_id = ?", (partner_id,))
         
-        return self.execute_query("DELETE FROM partners WHERE partner_id = ?", (partner_id,))
+        if not (self.execute_query("DELETE FROM partners WHERE partner_id = ?", (partner_id,)) and self.commit()):
+            return False
+
+        self.resolver.invalidate('partners')
+        return True
@@ -52,6 +52,74 @@ CREATE TABLE IF NOT EXISTS sales (
     FOREIGN KEY (product_id) REFERENCES products(product_id)
 );
 
+CREATE TABLE IF NOT EXISTS partner_sales_summary (
+    partner_id INTEGER PRIMARY KEY,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    sale_count INTEGER NOT NULL DEFAULT 0,
+    discount_percentage INTEGER GENERATED ALWAYS AS (
+        CASE
+            WHEN total_quantity < 10000 THEN 0
+            WHEN total_quantity < 50000 THEN 5
+            WHEN total_quantity < 300000 THEN 10
+            ELSE 15
+        END
+    ) VIRTUAL,
+    FOREIGN KEY (partner_id) REFERENCES partners(partner_id)
+);
+
+INSERT INTO partner_sales_summary (partner_id, total_quantity, sale_count)
+SELECT p.partner_id, COALESCE(SUM(s.quantity), 0), COUNT(s.sale_id)
+FROM partners p
+LEFT JOIN sales s ON p.partner_id = s.partner_id
+WHERE p.partner_id NOT IN (SELECT partner_id FROM partner_sales_summary)
+GROUP BY p.partner_id;
+
+CREATE TRIGGER IF NOT EXISTS trg_partners_insert_summary
+AFTER INSERT ON partners
+BEGIN
+    INSERT OR IGNORE INTO partner_sales_summary (partner_id) VALUES (NEW.partner_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_partners_delete_summary
+AFTER DELETE ON partners
+BEGIN
+    DELETE FROM partner_sales_summary WHERE partner_id = OLD.partner_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sales_insert_summary
+AFTER INSERT ON sales
+BEGIN
+    INSERT INTO partner_sales_summary (partner_id, total_quantity, sale_count)
+    VALUES (NEW.partner_id, NEW.quantity, 1)
+    ON CONFLICT(partner_id) DO UPDATE SET
+        total_quantity = total_quantity + excluded.total_quantity,
+        sale_count = sale_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sales_delete_summary
+AFTER DELETE ON sales
+BEGIN
+    UPDATE partner_sales_summary
+    SET total_quantity = total_quantity - OLD.quantity,
+        sale_count = sale_count - 1
+    WHERE partner_id = OLD.partner_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sales_update_summary
+AFTER UPDATE OF partner_id, quantity ON sales
+BEGIN
+    UPDATE partner_sales_summary
+    SET total_quantity = total_quantity - OLD.quantity,
+        sale_count = sale_count - 1
+    WHERE partner_id = OLD.partner_id;
+
+    INSERT INTO partner_sales_summary (partner_id, total_quantity, sale_count)
+    VALUES (NEW.partner_id, NEW.quantity, 1)
+    ON CONFLICT(partner_id) DO UPDATE SET
+        total_quantity = total_quantity + excluded.total_quantity,
+        sale_count = sale_count + 1;
+END;
+
 CREATE INDEX IF NOT EXISTS idx_partners_name ON partners(partner_name);
 CREATE INDEX IF NOT EXISTS idx_sales_partner ON sales(partner_id);
 CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date);
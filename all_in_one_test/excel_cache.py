@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Колоночный кэш разобранных Excel-файлов ресурсов
+
+Каждая книга сохраняется рядом с исходником в каталоге .excel_cache в виде
+набора .npy-файлов (по одному на столбец), ключом служит хэш содержимого файла.
+Повторное чтение не разбирает XML: числовые столбцы отображаются в память без
+копирования, строковые и смешанные читаются из .npy в объекты Python. Смешанные
+столбцы хранятся текстом с кодом типа значения: pickle не используется, и файлы
+каталога кэша не могут выполнить код при загрузке.
+
+Использование:
+    python excel_cache.py warm [папка_ресурсов]
+    python excel_cache.py clear [папка_ресурсов]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, time
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESOURCES_PATH = os.path.join("KOD_09_02_07-2-2025_Prilozhenia_k_obraztsu_zadania_Tom_1", "Ресурсы")
+
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExcelCache:
+
+    CACHE_DIR_NAME = ".excel_cache"
+    META_FILE_NAME = "columns.json"
+
+    # Коды типов значений смешанного столбца
+    TYPE_NULL, TYPE_STR, TYPE_INT, TYPE_FLOAT, TYPE_BOOL, TYPE_DATETIME, TYPE_TIME = range(7)
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def for_file(cls, file_path: str) -> 'ExcelCache':
+        return cls(os.path.join(os.path.dirname(os.path.abspath(file_path)), cls.CACHE_DIR_NAME))
+
+    def entry_path(self, file_path: str, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{os.path.basename(file_path)}-{content_hash[:16]}")
+
+    def load(self, file_path: str, content_hash: str) -> Optional[pd.DataFrame]:
+        entry_path = self.entry_path(file_path, content_hash)
+        meta_path = os.path.join(entry_path, self.META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+
+            data = {}
+            for index, column in enumerate(meta['columns']):
+                column_path = os.path.join(entry_path, f"col_{index}.npy")
+                if column['kind'] == 'numeric':
+                    values = np.load(column_path, mmap_mode='r')
+                elif column['kind'] == 'str':
+                    # Строки pandas хранит объектами, поэтому столбец читается целиком;
+                    # пропуски - NaN, как после pd.read_excel
+                    values = np.load(column_path).astype(object)
+                    values[np.load(os.path.join(entry_path, f"col_{index}.mask.npy"))] = np.nan
+                elif column['kind'] == 'mixed':
+                    types = np.load(os.path.join(entry_path, f"col_{index}.types.npy"))
+                    values = np.array(
+                        [self._decode_value(value_type, text) for value_type, text in zip(types.tolist(), np.load(column_path).tolist())],
+                        dtype=object
+                    )
+                else:
+                    # Записи прежнего формата (pickle) не читаются и перезаписываются после разбора
+                    return None
+                data[index] = values
+
+            # copy=False: числовые столбцы остаются отдельными блоками поверх memmap
+            df = pd.DataFrame(data, copy=False)
+            df.columns = [column['name'] for column in meta['columns']]
+            return df
+        except Exception as e:
+            print(f"Ошибка чтения кэша {entry_path}: {e}")
+            return None
+
+    def store(self, file_path: str, content_hash: str, df: pd.DataFrame):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self.entry_path(file_path, content_hash)
+        temp_path = tempfile.mkdtemp(dir=self.cache_dir)
+
+        try:
+            columns = []
+            for index in range(df.shape[1]):
+                series = df.iloc[:, index]
+                column_path = os.path.join(temp_path, f"col_{index}.npy")
+                kind = self._column_kind(series)
+
+                if kind == 'numeric':
+                    np.save(column_path, series.to_numpy())
+                elif kind == 'str':
+                    mask = series.isna().to_numpy()
+                    np.save(column_path, series.fillna('').to_numpy(dtype=str))
+                    np.save(os.path.join(temp_path, f"col_{index}.mask.npy"), mask)
+                else:
+                    encoded = [self._encode_value(value) for value in series.tolist()]
+                    np.save(column_path, np.array([text for _, text in encoded], dtype=str))
+                    np.save(os.path.join(temp_path, f"col_{index}.types.npy"),
+                            np.array([value_type for value_type, _ in encoded], dtype=np.int8))
+
+                columns.append({'name': str(df.columns[index]), 'kind': kind})
+
+            with open(os.path.join(temp_path, self.META_FILE_NAME), 'w', encoding='utf-8') as file:
+                json.dump({'source': os.path.basename(file_path), 'columns': columns}, file, ensure_ascii=False)
+
+            self._remove_entries(os.path.basename(file_path))
+            os.replace(temp_path, entry_path)
+        except Exception as e:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            print(f"Ошибка записи кэша {entry_path}: {e}")
+
+    @staticmethod
+    def _column_kind(series: pd.Series) -> str:
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            return 'numeric'
+        if series.dropna().map(type).eq(str).all():
+            return 'str'
+        return 'mixed'
+
+    @classmethod
+    def _encode_value(cls, value: Any) -> Tuple[int, str]:
+        # Значение смешанного столбца -> (код типа, текст); прочие типы не кэшируются (ValueError)
+        if value is None or pd.isna(value):
+            return cls.TYPE_NULL, ''
+        if isinstance(value, (bool, np.bool_)):
+            return cls.TYPE_BOOL, str(bool(value))
+        if isinstance(value, str):
+            return cls.TYPE_STR, value
+        if isinstance(value, (int, np.integer)):
+            return cls.TYPE_INT, str(int(value))
+        if isinstance(value, (float, np.floating)):
+            return cls.TYPE_FLOAT, repr(float(value))
+        if isinstance(value, datetime):
+            return cls.TYPE_DATETIME, pd.Timestamp(value).isoformat()
+        if isinstance(value, time):
+            return cls.TYPE_TIME, value.isoformat()
+        raise ValueError(f"неподдерживаемый тип значения {type(value).__name__}")
+
+    @classmethod
+    def _decode_value(cls, value_type: int, text: str) -> Any:
+        if value_type == cls.TYPE_STR:
+            return text
+        if value_type == cls.TYPE_INT:
+            return int(text)
+        if value_type == cls.TYPE_FLOAT:
+            return float(text)
+        if value_type == cls.TYPE_BOOL:
+            return text == 'True'
+        if value_type == cls.TYPE_DATETIME:
+            return pd.Timestamp(text)
+        if value_type == cls.TYPE_TIME:
+            return time.fromisoformat(text)
+        return np.nan
+
+    def _remove_entries(self, file_name: str):
+        # Устаревшие записи того же файла с другим хэшем
+        for entry in os.listdir(self.cache_dir):
+            if entry.startswith(f"{file_name}-"):
+                shutil.rmtree(os.path.join(self.cache_dir, entry), ignore_errors=True)
+
+    def clear(self) -> int:
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        entries_count = len(os.listdir(self.cache_dir))
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        return entries_count
+
+
+def read_excel_cached(file_path: str, content_hash: Optional[str] = None) -> pd.DataFrame:
+    if content_hash is None:
+        content_hash = file_hash(file_path)
+
+    cache = ExcelCache.for_file(file_path)
+    df = cache.load(file_path, content_hash)
+    if df is None:
+        df = pd.read_excel(file_path)
+        cache.store(file_path, content_hash, df)
+    return df
+
+
+def warm_cache(resources_path: str) -> int:
+    warmed_count = 0
+    for file_name in sorted(os.listdir(resources_path)):
+        if file_name.lower().endswith('.xlsx'):
+            read_excel_cached(os.path.join(resources_path, file_name))
+            warmed_count += 1
+    return warmed_count
+
+
+def clear_cache(resources_path: str) -> int:
+    return ExcelCache(os.path.join(resources_path, ExcelCache.CACHE_DIR_NAME)).clear()
+
+
+def main() -> int:
+    if len(sys.argv) < 2 or sys.argv[1] not in ('warm', 'clear'):
+        print(__doc__.strip())
+        return 1
+
+    resources_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_RESOURCES_PATH
+    if not os.path.isdir(resources_path):
+        print(f"Папка с ресурсами не найдена: {resources_path}")
+        return 1
+
+    if sys.argv[1] == 'warm':
+        print(f"Кэш подготовлен для файлов: {warm_cache(resources_path)}")
+    else:
+        print(f"Удалено записей кэша: {clear_cache(resources_path)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
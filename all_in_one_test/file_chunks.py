@@ -0,0 +1,42 @@
+from typing import Iterable, Iterator
+
+import openpyxl
+import pandas as pd
+
+
+def iter_excel_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    # Потоковое чтение листа: в памяти находится не более chunk_size строк
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        header = list(header)
+        while header and header[-1] is None:
+            header.pop()
+        width = len(header)
+
+        chunk = []
+        for row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            if all(value is None for value in row):
+                continue
+
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_file_chunks(file_path: str, chunk_size: int) -> Iterable[pd.DataFrame]:
+    # CSV или книга Excel по частям не более chunk_size строк
+    if file_path.lower().endswith(('.xlsx', '.xlsm')):
+        return iter_excel_chunks(file_path, chunk_size)
+    return pd.read_csv(file_path, chunksize=chunk_size)
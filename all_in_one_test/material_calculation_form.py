@@ -1,13 +1,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkinter import font as tkfont
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from material_calculator import MaterialCalculator
+from async_database_manager import AsyncDatabaseManager
 import re
 
 class MaterialCalculationForm:
     
-    def __init__(self, parent, material_calculator: MaterialCalculator):
+    def __init__(self, parent, material_calculator: MaterialCalculator,
+                 async_db: Optional[AsyncDatabaseManager] = None):
         self.parent = parent
         self.material_calculator = material_calculator
         self.product_types = []
@@ -20,6 +22,9 @@ class MaterialCalculationForm:
         self.window.transient(parent)
         self.window.grab_set()
 
+        self.owns_async_db = async_db is None
+        self.async_db = async_db or AsyncDatabaseManager(material_calculator.db_manager, self.window)
+
         self.center_window()
 
         self.setup_styles()
@@ -29,6 +34,9 @@ class MaterialCalculationForm:
         self.load_data()
 
         self.window.wait_window()
+
+        if self.owns_async_db:
+            self.async_db.shutdown()
     
     def setup_styles(self):
         self.colors = {
@@ -183,28 +191,39 @@ class MaterialCalculationForm:
         close_btn.pack(side=tk.LEFT)
     
     def load_data(self):
-        try:
-            product_types_result = self.material_calculator.db_manager.fetch_all(
-                "SELECT product_type_id, product_type_name, coefficient FROM product_types ORDER BY product_type_name"
-            )
-            self.product_types = [
-                {'id': row[0], 'name': row[1], 'coefficient': row[2]} 
-                for row in product_types_result
-            ]
-            
-            material_types_result = self.material_calculator.db_manager.fetch_all(
-                "SELECT material_type_id, material_type_name, waste_percentage FROM material_types ORDER BY material_type_name"
-            )
-            self.material_types = [
-                {'id': row[0], 'name': row[1], 'waste_percentage': row[2]} 
-                for row in material_types_result
-            ]
-            
-            self.product_type_combo['values'] = [f"{pt['id']} - {pt['name']} (коэф. {pt['coefficient']})" for pt in self.product_types]
-            self.material_type_combo['values'] = [f"{mt['id']} - {mt['name']} (брак {mt['waste_percentage']}%)" for mt in self.material_types]
-            
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка загрузки данных: {e}")
+        self.async_db.submit(self.query_reference_data,
+                             callback=self.on_data_loaded,
+                             error_callback=self.on_data_load_error)
+
+    def query_reference_data(self) -> tuple:
+        # Выполняется в потоке базы данных
+        product_types_result = self.material_calculator.db_manager.fetch_all(
+            "SELECT product_type_id, product_type_name, coefficient FROM product_types ORDER BY product_type_name"
+        )
+        product_types = [
+            {'id': row[0], 'name': row[1], 'coefficient': row[2]} 
+            for row in product_types_result
+        ]
+        
+        material_types_result = self.material_calculator.db_manager.fetch_all(
+            "SELECT material_type_id, material_type_name, waste_percentage FROM material_types ORDER BY material_type_name"
+        )
+        material_types = [
+            {'id': row[0], 'name': row[1], 'waste_percentage': row[2]} 
+            for row in material_types_result
+        ]
+        return product_types, material_types
+
+    def on_data_loaded(self, result: tuple):
+        if not self.window.winfo_exists():
+            return
+
+        self.product_types, self.material_types = result
+        self.product_type_combo['values'] = [f"{pt['id']} - {pt['name']} (коэф. {pt['coefficient']})" for pt in self.product_types]
+        self.material_type_combo['values'] = [f"{mt['id']} - {mt['name']} (брак {mt['waste_percentage']}%)" for mt in self.material_types]
+
+    def on_data_load_error(self, error: Exception):
+        messagebox.showerror("Ошибка", f"Ошибка загрузки данных: {error}")
     
     def on_product_type_change(self, event):
         self.clear_result()
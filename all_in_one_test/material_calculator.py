@@ -1,10 +1,54 @@
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
 from database_manager import DatabaseManager
 
 class MaterialCalculator:
+
+    # Столбцы входных данных пакетного расчета
+    BATCH_COLUMNS = ('product_type_id', 'material_type_id', 'quantity', 'param1', 'param2')
+
+    # Коды ошибок пакетного расчета (столбец error_code)
+    ERROR_NONE = 0
+    ERROR_INVALID_INPUT = 1
+    ERROR_INVALID_QUANTITY = 2
+    ERROR_INVALID_PARAMS = 3
+    ERROR_UNKNOWN_PRODUCT_TYPE = 4
+    ERROR_UNKNOWN_MATERIAL_TYPE = 5
+
+    ERROR_MESSAGES = {
+        ERROR_NONE: "",
+        ERROR_INVALID_INPUT: "Некорректные идентификаторы или нечисловые значения",
+        ERROR_INVALID_QUANTITY: "Количество продукции должно быть целым положительным числом",
+        ERROR_INVALID_PARAMS: "Параметры продукции должны быть положительными",
+        ERROR_UNKNOWN_PRODUCT_TYPE: "Тип продукции не найден",
+        ERROR_UNKNOWN_MATERIAL_TYPE: "Тип материала не найден"
+    }
+
+    # Пар (тип продукции, тип материала) в одном запросе справочников
+    LOOKUP_CHUNK_SIZE = 400
+
+    # Размер кэша результатов, рекомендуемый для интерфейса (0 - кэш отключен)
+    DEFAULT_RESULT_CACHE_SIZE = 1024
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, result_cache_size: int = 0):
         self.db_manager = db_manager
+
+        # Кэш справочников типов: загружается целиком и перечитывается,
+        # когда DatabaseManager увеличивает reference_data_version
+        self._reference_cache: Optional[Dict[str, Dict[int, float]]] = None
+        self._reference_version: Optional[int] = None
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {'hits': 0, 'misses': 0}
+
+        # Кэш результатов расчета (LRU): очищается при смене reference_data_version
+        self.result_cache_size = max(0, result_cache_size)
+        self._result_cache: 'OrderedDict[tuple, int]' = OrderedDict()
+        self._result_version: Optional[int] = None
+        self._result_lock = threading.Lock()
+        self.result_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
     
     def calculate_material_required(self, 
                                   product_type_id: int, 
@@ -12,19 +56,60 @@ class MaterialCalculator:
                                   product_quantity: int, 
                                   product_param1: float, 
                                   product_param2: float) -> int:
+        args = (product_type_id, material_type_id, product_quantity, product_param1, product_param2)
+        # Некорректные (в том числе нехэшируемые) аргументы в кэш не попадают
+        if not self.result_cache_size or not self._validate_input_parameters(*args):
+            return self._calculate_material_required(*args)
+
+        # Типы входят в ключ: 2 и 2.0 равны, но проходят проверку по-разному
+        key = args + tuple(type(value) for value in args)
+        version = self.db_manager.reference_data_version
+        with self._result_lock:
+            if self._result_version != version:
+                self._result_cache.clear()
+                self._result_version = version
+            result = self._result_cache.get(key)
+            if result is not None:
+                self._result_cache.move_to_end(key)
+                self.result_cache_stats['hits'] += 1
+                return result
+            self.result_cache_stats['misses'] += 1
+
+        result = self._calculate_material_required(*args)
+
+        # Ошибки не запоминаются: -1 может быть вызван временным сбоем базы
+        if result >= 0:
+            with self._result_lock:
+                if self._result_version == version:
+                    self._result_cache[key] = result
+                    self._result_cache.move_to_end(key)
+                    while len(self._result_cache) > self.result_cache_size:
+                        self._result_cache.popitem(last=False)
+                        self.result_cache_stats['evictions'] += 1
+        return result
+
+    def _calculate_material_required(self,
+                                     product_type_id: int,
+                                     material_type_id: int,
+                                     product_quantity: int,
+                                     product_param1: float,
+                                     product_param2: float) -> int:
         try:
             if not self._validate_input_parameters(product_type_id, material_type_id, 
                                                  product_quantity, product_param1, product_param2):
                 return -1
 
-            product_coefficient = self._get_product_type_coefficient(product_type_id)
-            if product_coefficient is None:
+            # Справочники берутся из кэша один раз на расчет
+            reference = self._reference_data()
+            if not self._product_type_exists(product_type_id, reference):
                 return -1
 
-            waste_percentage = self._get_material_waste_percentage(material_type_id)
-            if waste_percentage is None:
+            if not self._material_type_exists(material_type_id, reference):
                 return -1
 
+            product_coefficient = self._get_product_type_coefficient(product_type_id, reference)
+            waste_percentage = self._get_material_waste_percentage(material_type_id, reference)
+
             material_per_unit = product_param1 * product_param2 * product_coefficient
 
             total_material_needed = material_per_unit * product_quantity
@@ -58,42 +143,177 @@ class MaterialCalculator:
         if product_param1 <= 0 or product_param2 <= 0:
             return False
         
-        if not self._product_type_exists(product_type_id):
-            return False
-        
-        if not self._material_type_exists(material_type_id):
-            return False
-        
         return True
     
-    def _product_type_exists(self, product_type_id: int) -> bool:
-        result = self.db_manager.fetch_one(
-            "SELECT COUNT(*) FROM product_types WHERE product_type_id = ?",
-            (product_type_id,)
-        )
-        return result and result[0] > 0
+    def _reference_data(self) -> Dict[str, Dict[int, float]]:
+        version = self.db_manager.reference_data_version
+        with self._cache_lock:
+            if self._reference_cache is not None and self._reference_version == version:
+                self.cache_stats['hits'] += 1
+                return self._reference_cache
+
+            self.cache_stats['misses'] += 1
+            # Чтение через соединение: ошибка базы передается вызывающему, и пустой
+            # справочник не попадает в кэш
+            rows = self.db_manager.connection.execute("""
+                SELECT 'product_types', product_type_id, coefficient FROM product_types
+                UNION ALL
+                SELECT 'material_types', material_type_id, waste_percentage FROM material_types
+            """).fetchall()
+            cache = {'product_types': {}, 'material_types': {}}
+            for table_name, type_id, value in rows:
+                cache[table_name][type_id] = value
+
+            # Версия запоминается до чтения: запись во время загрузки вызовет повторную загрузку
+            self._reference_cache = cache
+            self._reference_version = version
+            return cache
+
+    def invalidate_cache(self):
+        with self._cache_lock:
+            self._reference_cache = None
+            self._reference_version = None
+        with self._result_lock:
+            self._result_cache.clear()
+            self._result_version = None
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            hits = self.cache_stats['hits']
+            misses = self.cache_stats['misses']
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'version': self._reference_version
+        }
+
+    def get_result_cache_stats(self) -> Dict[str, Any]:
+        with self._result_lock:
+            stats = dict(self.result_cache_stats)
+            stats['size'] = len(self._result_cache)
+        total = stats['hits'] + stats['misses']
+        stats['max_size'] = self.result_cache_size
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        return stats
     
-    def _material_type_exists(self, material_type_id: int) -> bool:
-        result = self.db_manager.fetch_one(
-            "SELECT COUNT(*) FROM material_types WHERE material_type_id = ?",
-            (material_type_id,)
-        )
-        return result and result[0] > 0
+    def _product_type_exists(self, product_type_id: int, reference: Dict[str, Dict[int, float]]) -> bool:
+        return product_type_id in reference['product_types']
     
-    def _get_product_type_coefficient(self, product_type_id: int) -> Optional[float]:
-        result = self.db_manager.fetch_one(
-            "SELECT coefficient FROM product_types WHERE product_type_id = ?",
-            (product_type_id,)
-        )
-        return result[0] if result else None
+    def _material_type_exists(self, material_type_id: int, reference: Dict[str, Dict[int, float]]) -> bool:
+        return material_type_id in reference['material_types']
     
-    def _get_material_waste_percentage(self, material_type_id: int) -> Optional[float]:
-        result = self.db_manager.fetch_one(
-            "SELECT waste_percentage FROM material_types WHERE material_type_id = ?",
-            (material_type_id,)
-        )
-        return result[0] if result else None
+    def _get_product_type_coefficient(self, product_type_id: int, reference: Dict[str, Dict[int, float]]) -> Optional[float]:
+        return reference['product_types'].get(product_type_id)
     
+    def _get_material_waste_percentage(self, material_type_id: int, reference: Dict[str, Dict[int, float]]) -> Optional[float]:
+        return reference['material_types'].get(material_type_id)
+    
+    def calculate_batch(self, orders: Union[pd.DataFrame, Dict[str, Any], np.ndarray]) -> pd.DataFrame:
+        # Пакетный расчет: справочные значения загружаются одним запросом на набор
+        # уникальных пар типов, формула и коды ошибок вычисляются по массивам целиком.
+        # Возвращает входные столбцы с добавленными material_required (-1 при ошибке) и error_code;
+        # при ошибке базы данных выбрасывается sqlite3.Error
+        frame = self._batch_frame(orders)
+        count = len(frame)
+
+        product_type_ids = pd.to_numeric(frame['product_type_id'], errors='coerce').to_numpy(dtype=float)
+        material_type_ids = pd.to_numeric(frame['material_type_id'], errors='coerce').to_numpy(dtype=float)
+        quantities = pd.to_numeric(frame['quantity'], errors='coerce').to_numpy(dtype=float)
+        params1 = pd.to_numeric(frame['param1'], errors='coerce').to_numpy(dtype=float)
+        params2 = pd.to_numeric(frame['param2'], errors='coerce').to_numpy(dtype=float)
+
+        error_codes = np.full(count, self.ERROR_NONE, dtype=np.int8)
+
+        # Проверки в том же порядке, что и в calculate_material_required; сохраняется первая ошибка
+        with np.errstate(invalid='ignore'):
+            checks = [
+                (self.ERROR_INVALID_INPUT,
+                 ~(np.isfinite(product_type_ids) & np.isfinite(material_type_ids) &
+                   (product_type_ids == np.trunc(product_type_ids)) &
+                   (material_type_ids == np.trunc(material_type_ids)) &
+                   np.isfinite(quantities) & np.isfinite(params1) & np.isfinite(params2))),
+                (self.ERROR_INVALID_QUANTITY, (quantities <= 0) | (quantities != np.trunc(quantities))),
+                (self.ERROR_INVALID_PARAMS, (params1 <= 0) | (params2 <= 0))
+            ]
+        for error_code, failed in checks:
+            error_codes[(error_codes == self.ERROR_NONE) & failed] = error_code
+
+        valid = error_codes == self.ERROR_NONE
+        product_type_ids = np.where(valid, product_type_ids, 0).astype(np.int64)
+        material_type_ids = np.where(valid, material_type_ids, 0).astype(np.int64)
+
+        coefficients, waste_percentages, product_found, material_found = self._lookup_reference_values(
+            product_type_ids, material_type_ids, valid
+        )
+        error_codes[valid & ~product_found] = self.ERROR_UNKNOWN_PRODUCT_TYPE
+        error_codes[valid & product_found & ~material_found] = self.ERROR_UNKNOWN_MATERIAL_TYPE
+        valid = error_codes == self.ERROR_NONE
+
+        # Тот же порядок операций, что и в расчете одной позиции, дает совпадающий результат
+        material_per_unit = params1 * params2 * coefficients
+        total_material_needed = material_per_unit * quantities
+        waste_factor = 1 + (waste_percentages / 100.0)
+        material_with_waste = total_material_needed * waste_factor
+
+        results = np.full(count, -1, dtype=np.int64)
+        results[valid] = (material_with_waste[valid] + 0.99).astype(np.int64)
+
+        result_frame = frame.copy()
+        result_frame['material_required'] = results
+        result_frame['error_code'] = error_codes
+        return result_frame
+
+    def _batch_frame(self, orders: Union[pd.DataFrame, Dict[str, Any], np.ndarray]) -> pd.DataFrame:
+        if isinstance(orders, pd.DataFrame):
+            frame = orders
+        elif isinstance(orders, np.ndarray):
+            if orders.ndim != 2 or orders.shape[1] != len(self.BATCH_COLUMNS):
+                raise ValueError(f"Ожидается массив с {len(self.BATCH_COLUMNS)} столбцами: {', '.join(self.BATCH_COLUMNS)}")
+            frame = pd.DataFrame(orders, columns=list(self.BATCH_COLUMNS))
+        else:
+            frame = pd.DataFrame(orders)
+
+        missing_columns = [column for column in self.BATCH_COLUMNS if column not in frame.columns]
+        if missing_columns:
+            raise ValueError(f"Отсутствуют столбцы: {', '.join(missing_columns)}")
+        return frame.reset_index(drop=True)
+
+    def _lookup_reference_values(self, product_type_ids: np.ndarray, material_type_ids: np.ndarray,
+                                 mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        pairs = pd.DataFrame({'product_type_id': product_type_ids, 'material_type_id': material_type_ids})
+        unique_pairs = pairs[mask].drop_duplicates()
+
+        rows = []
+        values = unique_pairs.to_numpy(dtype=np.int64).tolist()
+        for start in range(0, len(values), self.LOOKUP_CHUNK_SIZE):
+            chunk = values[start:start + self.LOOKUP_CHUNK_SIZE]
+            placeholders = ", ".join("(?, ?)" for _ in chunk)
+            query = f"""
+            WITH pairs(product_type_id, material_type_id) AS (VALUES {placeholders})
+            SELECT pairs.product_type_id, pairs.material_type_id,
+                   pt.product_type_id IS NOT NULL, pt.coefficient,
+                   mt.material_type_id IS NOT NULL, mt.waste_percentage
+            FROM pairs
+            LEFT JOIN product_types pt ON pt.product_type_id = pairs.product_type_id
+            LEFT JOIN material_types mt ON mt.material_type_id = pairs.material_type_id
+            """
+            # Ошибка запроса передается вызывающему: пустой ответ означал бы, что типы не найдены
+            rows.extend(self.db_manager.connection.execute(query, tuple(value for pair in chunk for value in pair)).fetchall())
+
+        lookup = pd.DataFrame(rows, columns=[
+            'product_type_id', 'material_type_id', 'product_found', 'coefficient', 'material_found', 'waste_percentage'
+        ]).astype({'product_type_id': np.int64, 'material_type_id': np.int64})
+        merged = pairs.merge(lookup, how='left', on=['product_type_id', 'material_type_id'])
+
+        return (
+            merged['coefficient'].to_numpy(dtype=float, na_value=np.nan),
+            merged['waste_percentage'].to_numpy(dtype=float, na_value=np.nan),
+            merged['product_found'].fillna(0).to_numpy(dtype=bool),
+            merged['material_found'].fillna(0).to_numpy(dtype=bool)
+        )
+
     def get_calculation_example(self) -> str:
         try:
             product_type_result = self.db_manager.fetch_one("SELECT product_type_id, coefficient FROM product_types LIMIT 1")
@@ -0,0 +1,152 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from material_calculator import MaterialCalculator
+
+class MaterialPlanner:
+
+    # Группировка дат продаж по периодам (формат strftime SQLite); None - за весь диапазон
+    PERIOD_FORMATS = {
+        'day': '%Y-%m-%d',
+        'month': '%Y-%m',
+        'year': '%Y',
+        None: None
+    }
+
+    # Параметры продукции по умолчанию, если для типа продукции они не заданы
+    DEFAULT_PARAMS = (1.0, 1.0)
+
+    PLAN_COLUMNS = ['material_type_id', 'partner_id', 'period', 'product_quantity', 'material_required']
+
+    def __init__(self, material_calculator: MaterialCalculator):
+        # Справочники и формула берутся из калькулятора, поэтому план совпадает с расчетом по позициям
+        self.material_calculator = material_calculator
+        self.db_manager = material_calculator.db_manager
+        self.last_errors: Dict[str, int] = {}
+
+    def plan_sales(self,
+                   material_types: Union[int, Dict[int, int]],
+                   product_params: Optional[Dict[int, Tuple[float, float]]] = None,
+                   date_from: Optional[Union[str, date, datetime]] = None,
+                   date_to: Optional[Union[str, date, datetime]] = None,
+                   period: Optional[str] = 'month') -> pd.DataFrame:
+        # Потребность по фактическим продажам: один проход по sales с группировкой в SQL
+        # по партнеру, типу продукции и периоду, затем пакетный расчет по группам.
+        # Округление вверх выполняется для каждой группы, как для одного заказа
+        if period not in self.PERIOD_FORMATS:
+            raise ValueError(f"Неизвестный период: {period}. Допустимые значения: day, month, year, None")
+
+        period_format = self.PERIOD_FORMATS[period]
+        period_sql = "strftime(?, s.sale_date)" if period_format else "''"
+        params = [period_format] if period_format else []
+
+        conditions = []
+        if date_from is not None:
+            conditions.append("s.sale_date >= ?")
+            params.append(self._format_date(date_from))
+        if date_to is not None:
+            conditions.append("s.sale_date <= ?")
+            params.append(self._format_date(date_to))
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = self.db_manager.fetch_all(f"""
+            SELECT s.partner_id, p.product_type_id, {period_sql} AS period, SUM(s.quantity)
+            FROM sales s
+            JOIN products p ON p.product_id = s.product_id
+            JOIN product_types pt ON pt.product_type_id = p.product_type_id
+            {where_sql}
+            GROUP BY s.partner_id, p.product_type_id, period
+        """, tuple(params))
+
+        groups = pd.DataFrame(rows, columns=['partner_id', 'product_type_id', 'period', 'quantity'])
+        return self._plan(groups, material_types, product_params)
+
+    def plan_catalog(self,
+                     material_types: Union[int, Dict[int, int]],
+                     planned_quantities: Union[int, Dict[int, int]] = 1,
+                     product_params: Optional[Dict[int, Tuple[float, float]]] = None,
+                     partner_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        # Потребность по ассортименту партнеров (partner_products): количество задается
+        # планом на продукт или одно на все позиции; по умолчанию - на единицу продукции
+        partner_filter = ""
+        params: Tuple[Any, ...] = ()
+        if partner_ids is not None:
+            partner_ids = tuple(partner_ids)
+            if not partner_ids:
+                return pd.DataFrame(columns=self.PLAN_COLUMNS)
+            partner_filter = f"WHERE pp.partner_id IN ({', '.join('?' for _ in partner_ids)})"
+            params = partner_ids
+
+        rows = self.db_manager.fetch_all(f"""
+            SELECT pp.partner_id, p.product_id, p.product_type_id
+            FROM partner_products pp
+            JOIN products p ON p.product_id = pp.product_id
+            JOIN product_types pt ON pt.product_type_id = p.product_type_id
+            {partner_filter}
+        """, params)
+
+        catalog = pd.DataFrame(rows, columns=['partner_id', 'product_id', 'product_type_id'])
+        if isinstance(planned_quantities, dict):
+            catalog['quantity'] = catalog['product_id'].map(planned_quantities)
+            catalog = catalog.dropna(subset=['quantity']).astype({'quantity': np.int64})
+        else:
+            catalog['quantity'] = planned_quantities
+
+        groups = catalog.groupby(['partner_id', 'product_type_id'], as_index=False)['quantity'].sum()
+        groups['period'] = ''
+        return self._plan(groups, material_types, product_params)
+
+    def _plan(self, groups: pd.DataFrame, material_types: Union[int, Dict[int, int]],
+              product_params: Optional[Dict[int, Tuple[float, float]]]) -> pd.DataFrame:
+        self.last_errors = {}
+        if groups.empty:
+            return pd.DataFrame(columns=self.PLAN_COLUMNS)
+
+        groups = groups.copy()
+        if isinstance(material_types, dict):
+            groups['material_type_id'] = groups['product_type_id'].astype(np.int64).map(material_types)
+        else:
+            groups['material_type_id'] = material_types
+
+        # Типы продукции без назначенного материала в план не входят
+        unassigned = groups['material_type_id'].isna()
+        if unassigned.any():
+            self.last_errors["Тип материала не назначен"] = int(unassigned.sum())
+            groups = groups[~unassigned].copy()
+            if groups.empty:
+                print(f"Позиции исключены из плана материалов: {self.last_errors}")
+                return pd.DataFrame(columns=self.PLAN_COLUMNS)
+
+        product_type_ids = groups['product_type_id'].astype(np.int64)
+        product_params = product_params or {}
+        groups['param1'] = product_type_ids.map(lambda type_id: product_params.get(type_id, self.DEFAULT_PARAMS)[0])
+        groups['param2'] = product_type_ids.map(lambda type_id: product_params.get(type_id, self.DEFAULT_PARAMS)[1])
+
+        calculated = self.material_calculator.calculate_batch(groups)
+
+        failed = calculated['error_code'] != MaterialCalculator.ERROR_NONE
+        for error_code, count in calculated.loc[failed, 'error_code'].value_counts().items():
+            self.last_errors[MaterialCalculator.ERROR_MESSAGES[error_code]] = int(count)
+        if self.last_errors:
+            print(f"Позиции исключены из плана материалов: {self.last_errors}")
+
+        plan = (calculated[~failed]
+                .rename(columns={'quantity': 'product_quantity'})
+                .astype({'material_type_id': np.int64})
+                .groupby(['material_type_id', 'partner_id', 'period'], as_index=False)
+                [['product_quantity', 'material_required']].sum())
+        return plan[self.PLAN_COLUMNS]
+
+    @staticmethod
+    def summarize(plan: pd.DataFrame, by: Iterable[str] = ('material_type_id',)) -> pd.DataFrame:
+        # Итоги плана по любому набору столбцов группировки (тип материала, партнер, период)
+        by = list(by)
+        if not by:
+            return plan[['product_quantity', 'material_required']].sum().to_frame().T
+        return plan.groupby(by, as_index=False)[['product_quantity', 'material_required']].sum()
+
+    @staticmethod
+    def _format_date(value: Union[str, date, datetime]) -> str:
+        # Даты продаж хранятся строками YYYY-MM-DD, граница включается в диапазон
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
@@ -0,0 +1,159 @@
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+
+def _partners_fts_sql(connection: sqlite3.Connection) -> str:
+    # Полнотекстовый индекс создается только если SQLite собран с FTS5
+    try:
+        connection.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(value)")
+        connection.execute("DROP TABLE temp.fts5_probe")
+    except sqlite3.OperationalError:
+        print("SQLite собран без FTS5, полнотекстовый поиск партнеров недоступен")
+        return ""
+
+    return """
+        CREATE VIRTUAL TABLE IF NOT EXISTS partners_fts USING fts5(
+            partner_name, contact_person, email, phone, address,
+            content='partners', content_rowid='partner_id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        INSERT INTO partners_fts(partners_fts) VALUES ('rebuild');
+
+        CREATE TRIGGER IF NOT EXISTS trg_partners_fts_insert
+        AFTER INSERT ON partners
+        BEGIN
+            INSERT INTO partners_fts (rowid, partner_name, contact_person, email, phone, address)
+            VALUES (NEW.partner_id, NEW.partner_name, NEW.contact_person, NEW.email, NEW.phone, NEW.address);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_partners_fts_delete
+        AFTER DELETE ON partners
+        BEGIN
+            INSERT INTO partners_fts (partners_fts, rowid, partner_name, contact_person, email, phone, address)
+            VALUES ('delete', OLD.partner_id, OLD.partner_name, OLD.contact_person, OLD.email, OLD.phone, OLD.address);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_partners_fts_update
+        AFTER UPDATE ON partners
+        BEGIN
+            INSERT INTO partners_fts (partners_fts, rowid, partner_name, contact_person, email, phone, address)
+            VALUES ('delete', OLD.partner_id, OLD.partner_name, OLD.contact_person, OLD.email, OLD.phone, OLD.address);
+            INSERT INTO partners_fts (rowid, partner_name, contact_person, email, phone, address)
+            VALUES (NEW.partner_id, NEW.partner_name, NEW.contact_person, NEW.email, NEW.phone, NEW.address);
+        END;
+    """
+
+# Нумерованные миграции схемы: (версия, описание, SQL или функция, возвращающая SQL).
+# Применённая версия хранится в PRAGMA user_version, каждая миграция выполняется один раз.
+MIGRATIONS: List[Tuple[int, str, Union[str, Callable[[sqlite3.Connection], str]]]] = [
+    (
+        1,
+        "Покрывающий индекс для истории продаж партнера",
+        """
+        DROP INDEX IF EXISTS idx_sales_partner_date;
+        CREATE INDEX IF NOT EXISTS idx_sales_partner_history
+            ON sales(partner_id, sale_date DESC, sale_id DESC, product_id, quantity);
+        """
+    ),
+    (
+        2,
+        "Уникальный индекс связей партнер-продукт",
+        """
+        DELETE FROM partner_products
+        WHERE partner_product_id NOT IN (
+            SELECT MIN(partner_product_id) FROM partner_products GROUP BY partner_id, product_id
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_partner_products_partner_product
+            ON partner_products(partner_id, product_id);
+        """
+    ),
+    (
+        3,
+        "Манифест импорта файлов ресурсов",
+        """
+        CREATE TABLE IF NOT EXISTS import_manifest (
+            file_name TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS import_manifest_rows (
+            file_name TEXT NOT NULL,
+            row_hash INTEGER NOT NULL,
+            PRIMARY KEY (file_name, row_hash)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_products_name ON products(product_name);
+        CREATE INDEX IF NOT EXISTS idx_materials_name ON materials(material_name, material_type_id);
+        """
+    ),
+    (
+        4,
+        "Полнотекстовый индекс партнеров (FTS5)",
+        _partners_fts_sql
+    ),
+    (
+        5,
+        "Учет отклоненных строк в манифесте импорта",
+        """
+        ALTER TABLE import_manifest ADD COLUMN rejected_rows INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE import_manifest_rows ADD COLUMN seen INTEGER NOT NULL DEFAULT 1;
+        """
+    ),
+    (
+        6,
+        "Индексы, временно удаленные на время массовой загрузки",
+        """
+        CREATE TABLE IF NOT EXISTS pending_indexes (
+            index_name TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            sql TEXT NOT NULL
+        );
+        """
+    ),
+    (
+        7,
+        "Связь строк файлов импорта с созданными записями",
+        # Прежние строки манифеста не связаны с записями: при первом импорте файла
+        # строки сопоставляются с совпадающими существующими записями
+        """
+        DROP TABLE IF EXISTS import_manifest_rows;
+        CREATE TABLE import_manifest_rows (
+            file_name TEXT NOT NULL,
+            row_number INTEGER NOT NULL,
+            row_hash INTEGER NOT NULL,
+            entity_id INTEGER,
+            PRIMARY KEY (file_name, row_number)
+        ) WITHOUT ROWID;
+        DROP INDEX IF EXISTS idx_products_name;
+        DROP INDEX IF EXISTS idx_materials_name;
+        """
+    )
+]
+
+
+def get_schema_version(connection: sqlite3.Connection) -> int:
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(connection: sqlite3.Connection) -> int:
+    current_version = get_schema_version(connection)
+
+    for version, description, sql in sorted(MIGRATIONS):
+        if version <= current_version:
+            continue
+
+        if callable(sql):
+            sql = sql(connection)
+
+        try:
+            connection.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except Exception:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+
+        print(f"Применена миграция {version}: {description}")
+        current_version = version
+
+    return current_version
@@ -0,0 +1,229 @@
+import heapq
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
+from search_controller import SearchCancelled
+
+
+class PartnerSearchIndex:
+
+    # Поля, по которым ищет строка поиска в списке партнеров
+    FIELDS = ('partner_name', 'contact_person', 'email')
+    NGRAM_SIZE = 3
+
+    # Разделитель полей в тексте записи: не встречается в запросе, поэтому совпадение
+    # не может пересечь границу полей
+    FIELD_SEPARATOR = '\x00'
+
+    # Кандидатов меньше этого числа проще проверить напрямую, чем пересекать дальше
+    VERIFY_THRESHOLD = 64
+
+    # Через сколько записей поиск проверяет, не устарел ли запрос
+    CANCEL_CHECK_INTERVAL = 2000
+
+    def __init__(self):
+        # Индекс пополняется в потоке Tk, а поиск выполняется в фоновом потоке
+        self._lock = threading.RLock()
+        # Номер изменения содержимого: результат, посчитанный по старому снимку, не сохраняется для сужения
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._texts: Dict[int, str] = {}
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._positions: Dict[int, int] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._reset_narrowing()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def normalize(text: Any) -> str:
+        # casefold корректно приводит и кириллицу, и латиницу
+        return str(text).casefold() if text else ''
+
+    def _ngrams(self, text: str) -> Set[str]:
+        size = self.NGRAM_SIZE
+        return {text[index:index + size] for index in range(len(text) - size + 1)}
+
+    def _document_ngrams(self, text: str) -> Set[str]:
+        # N-граммы строятся по каждому полю отдельно и не пересекают границы полей
+        grams = set()
+        for field_text in text.split(self.FIELD_SEPARATOR):
+            grams |= self._ngrams(field_text)
+        return grams
+
+    def _reset_narrowing(self):
+        self._generation += 1
+        self._last_query: Optional[str] = None
+        self._last_result: Optional[Set[int]] = None
+
+    def add_or_update(self, partner: Dict[str, Any]) -> bool:
+        with self._lock:
+            return self._add_or_update(partner)
+
+    def _add_or_update(self, partner: Dict[str, Any]) -> bool:
+        partner_id = partner['partner_id']
+        text = self.FIELD_SEPARATOR.join(self.normalize(partner.get(field)) for field in self.FIELDS)
+        if partner_id not in self._positions:
+            self._positions[partner_id] = len(self._positions)
+        self._records[partner_id] = partner
+
+        old_text = self._texts.get(partner_id)
+        if old_text == text:
+            return False
+
+        if old_text is not None:
+            self._remove_postings(partner_id, old_text)
+        self._texts[partner_id] = text
+        for gram in self._document_ngrams(text):
+            self._postings[gram].add(partner_id)
+
+        self._reset_narrowing()
+        return True
+
+    def remove(self, partner_id: int):
+        with self._lock:
+            text = self._texts.pop(partner_id, None)
+            self._records.pop(partner_id, None)
+            self._positions.pop(partner_id, None)
+            if text is not None:
+                self._remove_postings(partner_id, text)
+                self._reset_narrowing()
+
+    def retain(self, partner_ids: List[int]):
+        # Удаление отсутствующих записей и восстановление порядка загрузки
+        kept_ids = set(partner_ids)
+        with self._lock:
+            for partner_id in [partner_id for partner_id in self._records if partner_id not in kept_ids]:
+                self.remove(partner_id)
+
+            self._records = {partner_id: self._records[partner_id] for partner_id in partner_ids if partner_id in self._records}
+            self._positions = {partner_id: position for position, partner_id in enumerate(self._records)}
+
+    def _remove_postings(self, partner_id: int, text: str):
+        for gram in self._document_ngrams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(partner_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def matches(self, partner_id: int, search_text: str) -> bool:
+        query = self.normalize(search_text)
+        with self._lock:
+            text = self._texts.get(partner_id)
+            return not query or (text is not None and query in text)
+
+    def search(self, search_text: str, limit: Optional[int] = None,
+               is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        # Результат в порядке загрузки; limit ограничивает число найденных записей,
+        # и просмотр прекращается, как только они набраны. Устаревший запрос (is_cancelled)
+        # прерывается исключением SearchCancelled
+        query = self.normalize(search_text)
+
+        # Под блокировкой берется только снимок кандидатов и порядка записей: просмотр идет
+        # без нее, и поток Tk не ждет поиска при пополнении индекса
+        with self._lock:
+            if not query:
+                records = iter(self._records.values())
+                return [record for _, record in zip(range(limit), records)] if limit is not None else list(records)
+
+            generation = self._generation
+            candidates, exact = self._candidates(query)
+            dense = self._is_dense(candidates, limit)
+            # Разреженные кандидаты копируются, частые проверяются по снимку порядка записей
+            order = list(self._records) if dense else list(candidates)
+            texts, positions = self._texts, self._positions
+
+        if dense:
+            found = self._scan(query, order, candidates, exact, limit, texts, is_cancelled)
+        else:
+            found = self._collect(query, order, exact, limit, texts, positions, is_cancelled)
+
+        with self._lock:
+            # Усеченный результат не годится для сужения следующего запроса
+            if (limit is None or len(found) < limit) and generation == self._generation:
+                self._last_query = query
+                self._last_result = set(found)
+            return [self._records[partner_id] for partner_id in found if partner_id in self._records]
+
+    def _candidates(self, query: str) -> Tuple[Optional[Set[int]], bool]:
+        # Возвращает (кандидаты или None - все записи, кандидаты точно содержат запрос)
+        if self._last_query == query:
+            return self._last_result, True
+
+        # При расширении запроса сужается предыдущий полный результат вместо поиска по всем
+        candidates = None
+        if self._last_query is not None and self._last_query in query:
+            candidates = self._last_result
+
+        if len(query) < self.NGRAM_SIZE:
+            return candidates, False
+
+        # Запрос из одной n-граммы совпадает с ее списком записей, проверка не нужна
+        grams = sorted(self._ngrams(query), key=lambda gram: len(self._postings.get(gram, ())))
+        exact = len(grams) == 1
+        for gram in grams:
+            if candidates is not None and len(candidates) <= self.VERIFY_THRESHOLD:
+                exact = False
+                break
+            posting = self._postings.get(gram)
+            if not posting:
+                return set(), True
+            candidates = posting & candidates if candidates is not None else posting
+        return candidates, exact
+
+    def _is_dense(self, candidates: Optional[Set[int]], limit: Optional[int]) -> bool:
+        # Просмотр по порядку загрузки до limit совпадений дешевле сортировки, если кандидаты
+        # встречаются часто: ожидаемая длина просмотра limit * записей / кандидатов
+        if candidates is None:
+            return True
+        scan_length = len(self._records)
+        if candidates and limit is not None:
+            scan_length = min(scan_length, limit * len(self._records) // len(candidates))
+        return len(candidates) >= scan_length
+
+    def _check_cancelled(self, index: int, is_cancelled: Optional[Callable[[], bool]]):
+        if is_cancelled is not None and index % self.CANCEL_CHECK_INTERVAL == 0 and is_cancelled():
+            raise SearchCancelled()
+
+    def _collect(self, query: str, candidates: List[int], exact: bool, limit: Optional[int],
+                 texts: Dict[int, str], positions: Dict[int, int],
+                 is_cancelled: Optional[Callable[[], bool]]) -> List[int]:
+        # Мало кандидатов: упорядочить их по позиции загрузки (удаленные после снимка - в конец)
+        position = lambda partner_id: positions.get(partner_id, len(positions))
+        if exact and limit is not None:
+            return heapq.nsmallest(limit, candidates, key=position)
+        candidates.sort(key=position)
+        if exact:
+            return candidates
+
+        found = []
+        for index, partner_id in enumerate(candidates):
+            self._check_cancelled(index, is_cancelled)
+            if query in texts.get(partner_id, ''):
+                found.append(partner_id)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def _scan(self, query: str, order: List[int], candidates: Optional[Set[int]], exact: bool,
+              limit: Optional[int], texts: Dict[int, str],
+              is_cancelled: Optional[Callable[[], bool]]) -> List[int]:
+        # Много кандидатов: просмотр записей в порядке загрузки до набора limit совпадений
+        found = []
+        for index, partner_id in enumerate(order):
+            self._check_cancelled(index, is_cancelled)
+            if candidates is not None and partner_id not in candidates:
+                continue
+            if exact or query in texts.get(partner_id, ''):
+                found.append(partner_id)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
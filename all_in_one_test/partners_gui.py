@@ -4,12 +4,29 @@ from tkinter import font as tkfont
 import os
 from typing import Dict, Any, Optional
 from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
 from material_calculator import MaterialCalculator
 from partner_form import PartnerForm
+from partner_search_index import PartnerSearchIndex
+from search_controller import SearchController
+from virtual_treeview import VirtualTreeview
 from sales_history_form import SalesHistoryForm
 from material_calculation_form import MaterialCalculationForm
 
 class PartnersGUI:
+
+    # Столбцы таблицы и соответствующие поля для сортировки
+    PARTNER_SORT_FIELDS = {
+        'ID': 'partner_id',
+        'Название': 'partner_name',
+        'Контактное лицо': 'contact_person',
+        'Телефон': 'phone',
+        'Email': 'email',
+        'Адрес': 'address',
+        'Дата регистрации': 'registration_date',
+        'Общие продажи': 'total_sales',
+        'Скидка (%)': 'discount_percentage'
+    }
     
     def __init__(self):
         self.root = tk.Tk()
@@ -18,10 +35,32 @@ class PartnersGUI:
         self.root.minsize(1000, 600)
 
         self.db_manager = DatabaseManager()
-        self.material_calculator = MaterialCalculator(self.db_manager)
+        if os.environ.get('PARTNERS_SQL_PROFILE'):
+            self.db_manager.enable_profiling(float(os.environ.get('PARTNERS_SQL_SLOW_MS', '100')) / 1000)
+        self.material_calculator = MaterialCalculator(
+            self.db_manager,
+            result_cache_size=int(os.environ.get('PARTNERS_CALC_CACHE_SIZE', MaterialCalculator.DEFAULT_RESULT_CACHE_SIZE))
+        )
+        self.async_db = AsyncDatabaseManager(self.db_manager, self.root)
+        self.search_controller = SearchController(
+            self.root, self.run_partner_search, self.on_partner_search_done,
+            delay_ms=int(os.environ.get('PARTNERS_SEARCH_DELAY_MS', SearchController.DEFAULT_DELAY_MS)),
+            error_callback=self.on_partners_load_error
+        )
 
         self.current_partner_id = None
         self.partners_data = []
+        # partner_id -> запись; позиции и элементы таблицы индексирует VirtualTreeview
+        self.partners_by_id = {}
+        self.load_generation = 0
+        self.search_results = {}
+        # Результат поиска ограничен SEARCH_LIMIT: догружаемые страницы в него не добавляются
+        self.search_truncated = False
+        self.search_index = PartnerSearchIndex()
+        self.indexed_partner_ids = []
+        self.staged_partners = []
+        self.partners_loaded = False
+        self.load_order_by = []
 
         self.setup_styles()
 
@@ -173,31 +212,36 @@ class PartnersGUI:
         
         columns = ('ID', 'Название', 'Контактное лицо', 'Телефон', 'Email', 'Адрес', 'Дата регистрации', 'Общие продажи', 'Скидка (%)')
         
-        self.partners_tree = ttk.Treeview(content_frame, columns=columns, show='headings', height=20)
+        self.partners_tree = VirtualTreeview(content_frame, columns,
+                                             row_values=self.partner_row_values,
+                                             row_key=lambda partner: partner['partner_id'],
+                                             row_tags=self.partner_row_tags,
+                                             sort_keys={
+                                                 col: lambda partner, field=field: DatabaseManager.sort_value(
+                                                     partner, field, DatabaseManager.PARTNER_SORT_COLUMNS)
+                                                 for col, field in self.PARTNER_SORT_FIELDS.items()
+                                             },
+                                             on_sort=self.on_partners_sort,
+                                             height=20)
+        tree = self.partners_tree.tree
         
         for col in columns:
-            self.partners_tree.heading(col, text=col, command=lambda c=col: self.sort_treeview(c))
-            self.partners_tree.column(col, width=120, minwidth=100)
-        
-        self.partners_tree.column('ID', width=50, minwidth=50)
-        self.partners_tree.column('Название', width=200, minwidth=150)
-        self.partners_tree.column('Email', width=150, minwidth=120)
-        self.partners_tree.column('Общие продажи', width=100, minwidth=80)
-        self.partners_tree.column('Скидка (%)', width=80, minwidth=60)
+            tree.column(col, width=120, minwidth=100)
         
-        v_scrollbar = ttk.Scrollbar(content_frame, orient=tk.VERTICAL, command=self.partners_tree.yview)
-        h_scrollbar = ttk.Scrollbar(content_frame, orient=tk.HORIZONTAL, command=self.partners_tree.xview)
-        self.partners_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        self.partners_tree.grid(row=0, column=0, sticky='nsew')
-        v_scrollbar.grid(row=0, column=1, sticky='ns')
-        h_scrollbar.grid(row=1, column=0, sticky='ew')
+        tree.column('ID', width=50, minwidth=50)
+        tree.column('Название', width=200, minwidth=150)
+        tree.column('Email', width=150, minwidth=120)
+        tree.column('Общие продажи', width=100, minwidth=80)
+        tree.column('Скидка (%)', width=80, minwidth=60)
+
+        tree.tag_configure('high_discount', background=self.colors['success'])
+        tree.tag_configure('medium_discount', background=self.colors['warning'])
+        tree.tag_configure('low_discount', background=self.colors['accent'])
         
-        content_frame.grid_rowconfigure(0, weight=1)
-        content_frame.grid_columnconfigure(0, weight=1)
+        self.partners_tree.pack(fill=tk.BOTH, expand=True)
         
-        self.partners_tree.bind('<Double-1>', self.on_partner_double_click)
-        self.partners_tree.bind('<<TreeviewSelect>>', self.on_partner_select)
+        tree.bind('<Double-1>', self.on_partner_double_click, add='+')
+        tree.bind('<<TreeviewSelect>>', self.on_partner_select, add='+')
         
         self.create_info_panel(parent)
     
@@ -280,55 +324,204 @@ class PartnersGUI:
             messagebox.showerror("Ошибка", f"Ошибка инициализации базы данных: {e}")
             return False
     
-    def load_partners_data(self):
-        try:
-            self.partners_data = self.db_manager.get_partners_list()
-            self.update_partners_tree()
+    def load_partners_data(self, staged: bool = False):
+        # Первая страница отображается сразу, остальные догружаются в потоке базы данных.
+        # При обновлении после изменений (staged) страницы собираются целиком
+        # и сверяются с таблицей, чтобы сохранить выбор и прокрутку
+        self.load_generation += 1
+        self.staged_partners = []
+        self.load_order_by = self.partner_order_by()
+        if not staged:
+            self.partners_loaded = False
+        self.request_partners_page(self.load_generation, None, staged)
+
+    def partner_order_by(self):
+        return [(self.PARTNER_SORT_FIELDS[col], descending) for col, descending in self.partners_tree.sort_columns]
+
+    def request_partners_page(self, generation: int, cursor, staged: bool = False):
+        self.async_db.get_partners_page(
+            cursor,
+            order_by=self.load_order_by,
+            callback=lambda result: self.on_partners_page_loaded(generation, cursor, result, staged),
+            error_callback=self.on_partners_load_error
+        )
+
+    def on_partners_page_loaded(self, generation: int, cursor, result, staged: bool = False):
+        if generation != self.load_generation:
+            return
+
+        page, next_cursor = result
+        self.apply_partners_page(page, cursor is None, next_cursor is None, staged)
+
+        if next_cursor is None:
+            return
+        if self.load_order_by:
+            # Страница по произвольной сортировке - полная сортировка таблицы в потоке базы данных,
+            # поэтому остаток списка запрашивается одним запросом, а не постранично
+            self.async_db.get_partners_page(
+                next_cursor,
+                page_size=None,
+                order_by=self.load_order_by,
+                callback=lambda result: self.on_partners_rest_loaded(generation, result[0], 0, staged),
+                error_callback=self.on_partners_load_error
+            )
+        else:
+            self.request_partners_page(generation, next_cursor, staged)
+
+    def on_partners_rest_loaded(self, generation: int, partners, start: int, staged: bool):
+        # Остаток упорядоченного списка передается в таблицу частями по PAGE_SIZE,
+        # чтобы поток Tk не блокировался на всем списке
+        if generation != self.load_generation:
+            return
+
+        end = start + self.db_manager.PAGE_SIZE
+        self.apply_partners_page(partners[start:end], False, end >= len(partners), staged)
+        if end < len(partners):
+            self.root.after_idle(self.on_partners_rest_loaded, generation, partners, end, staged)
+
+    def apply_partners_page(self, page, first_page: bool, last_page: bool, staged: bool):
+        if self.is_search_index_enabled():
+            self.update_search_index(page, first_page, last_page)
+
+        if staged:
+            self.staged_partners.extend(page)
+            if last_page:
+                self.partners_data = self.staged_partners
+                self.partners_by_id = {partner['partner_id']: partner for partner in self.partners_data}
+                self.staged_partners = []
+                self.update_partners_tree()
+                self.update_status()
+        else:
+            if first_page:
+                self.partners_data = page
+                self.partners_by_id = {partner['partner_id']: partner for partner in page}
+                self.update_partners_tree()
+            else:
+                self.partners_data.extend(page)
+                self.partners_by_id.update((partner['partner_id'], partner) for partner in page)
+                if not self.is_full_text_search_active() and not self.search_truncated:
+                    self.insert_partner_rows(self.filter_partners(page))
             self.update_status()
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка загрузки данных: {e}")
-    
-    def update_partners_tree(self):
-        for item in self.partners_tree.get_children():
-            self.partners_tree.delete(item)
-        
+
+        if last_page:
+            self.partners_loaded = True
+
+    def on_partners_load_error(self, error: Exception):
+        messagebox.showerror("Ошибка", f"Ошибка загрузки данных: {error}")
+
+    def is_search_index_enabled(self) -> bool:
+        # Без FTS5 поиск идет по локальному индексу n-грамм
+        return not self.db_manager.has_full_text_search()
+
+    def update_search_index(self, page, first_page: bool, last_page: bool):
+        if first_page:
+            self.indexed_partner_ids = []
+        for partner in page:
+            self.search_index.add_or_update(partner)
+            self.indexed_partner_ids.append(partner['partner_id'])
+        if last_page:
+            self.search_index.retain(self.indexed_partner_ids)
+
+    def partner_matches(self, partner: Dict[str, Any], search_text: str) -> bool:
+        if self.is_search_index_enabled():
+            return self.search_index.matches(partner['partner_id'], search_text)
+
+        return (search_text in partner['partner_name'].lower() or
+                (partner['contact_person'] and search_text in partner['contact_person'].lower()) or
+                (partner['email'] and search_text in partner['email'].lower()))
+
+    def filter_partners(self, partners):
         search_text = self.search_var.get().lower()
-        filtered_data = self.partners_data
-        
-        if search_text:
-            filtered_data = [
-                partner for partner in self.partners_data
-                if search_text in partner['partner_name'].lower() or
-                   (partner['contact_person'] and search_text in partner['contact_person'].lower()) or
-                   (partner['email'] and search_text in partner['email'].lower())
-            ]
-
-        for partner in filtered_data:
-            values = (
-                partner['partner_id'],
-                partner['partner_name'],
-                partner['contact_person'] or '',
-                partner['phone'] or '',
-                partner['email'] or '',
-                partner['address'] or '',
-                partner['registration_date'] or '',
-                f"{partner['total_sales']:,}" if partner['total_sales'] else '0',
-                f"{partner['discount_percentage']}%"
+        if not search_text:
+            return partners
+
+        return [partner for partner in partners if self.partner_matches(partner, search_text)]
+    
+    def is_full_text_search_active(self) -> bool:
+        return bool(self.search_var.get().strip()) and self.db_manager.has_full_text_search()
+
+    def run_partner_search(self, search_text: str):
+        # Выполняется в потоке поиска; возвращает найденных партнеров и число учтенных загруженных записей
+        partners = self.partners_data
+        loaded_count = len(partners)
+
+        if search_text.strip() and self.db_manager.has_full_text_search():
+            # Ранжированный поиск по префиксам в FTS5 без загрузки всех партнеров
+            return self.db_manager.search_partners(search_text.strip()), None, 0
+
+        if self.is_search_index_enabled():
+            # Как и в FTS5, выводятся первые SEARCH_LIMIT совпадений
+            found = self.search_index.search(
+                search_text, limit=self.db_manager.SEARCH_LIMIT, is_cancelled=self.search_controller.is_cancelled
             )
+            return found, partners, loaded_count
 
-            tags = ()
-            if partner['discount_percentage'] >= 15:
-                tags = ('high_discount',)
-            elif partner['discount_percentage'] >= 10:
-                tags = ('medium_discount',)
-            elif partner['discount_percentage'] >= 5:
-                tags = ('low_discount',)
-            
-            self.partners_tree.insert('', 'end', values=values, tags=tags)
-        
-        self.partners_tree.tag_configure('high_discount', background=self.colors['success'])
-        self.partners_tree.tag_configure('medium_discount', background=self.colors['warning'])
-        self.partners_tree.tag_configure('low_discount', background=self.colors['accent'])
+        search_text = search_text.lower()
+        found = self.search_controller.filter(
+            partners[:loaded_count],
+            lambda partner: self.partner_matches(partner, search_text)
+        )
+        return found, partners, loaded_count
+
+    def on_partner_search_done(self, search_text: str, result):
+        found, partners, loaded_count = result
+        if partners is None:
+            self.search_results = {partner['partner_id']: partner for partner in found}
+        self.search_truncated = (
+            (partners is None or self.is_search_index_enabled()) and len(found) >= self.db_manager.SEARCH_LIMIT
+        )
+        self.render_partners(found)
+        if self.search_truncated:
+            self.status_label.config(text=f"Показаны первые {len(found)} совпадений, уточните запрос")
+
+        # Страницы, загруженные во время поиска, дофильтровываются здесь
+        if partners is self.partners_data and len(partners) > loaded_count and not self.search_truncated:
+            shown_ids = {partner['partner_id'] for partner in found}
+            self.insert_partner_rows([
+                partner for partner in self.filter_partners(partners[loaded_count:])
+                if partner['partner_id'] not in shown_ids
+            ])
+
+    def update_partners_tree(self, immediate: bool = True):
+        search_text = self.search_var.get()
+        if not search_text:
+            self.search_controller.cancel()
+            self.search_truncated = False
+            self.render_partners(self.partners_data)
+        elif immediate:
+            self.search_controller.run(search_text)
+        else:
+            self.search_controller.schedule(search_text)
+
+    def render_partners(self, partners):
+        self.partners_tree.update_rows(partners)
+
+    def insert_partner_rows(self, partners):
+        self.partners_tree.append_rows(partners)
+
+    @staticmethod
+    def partner_row_values(partner: Dict[str, Any]) -> tuple:
+        return (
+            partner['partner_id'],
+            partner['partner_name'],
+            partner['contact_person'] or '',
+            partner['phone'] or '',
+            partner['email'] or '',
+            partner['address'] or '',
+            partner['registration_date'] or '',
+            f"{partner['total_sales']:,}" if partner['total_sales'] else '0',
+            f"{partner['discount_percentage']}%"
+        )
+
+    @staticmethod
+    def partner_row_tags(partner: Dict[str, Any]) -> tuple:
+        if partner['discount_percentage'] >= 15:
+            return ('high_discount',)
+        elif partner['discount_percentage'] >= 10:
+            return ('medium_discount',)
+        elif partner['discount_percentage'] >= 5:
+            return ('low_discount',)
+        return ()
     
     def update_status(self):
         total_partners = len(self.partners_data)
@@ -340,24 +533,26 @@ class PartnersGUI:
             self.status_label.config(text="Данные загружены успешно")
     
     def on_search_change(self, *args):
-        self.update_partners_tree()
+        self.update_partners_tree(immediate=False)
     
     def on_partner_select(self, event):
-        selection = self.partners_tree.selection()
-        if selection:
-            item = self.partners_tree.item(selection[0])
-            partner_id = item['values'][0]
-            self.show_partner_info(partner_id)
+        partner = self.partners_tree.selected_record()
+        if partner:
+            self.show_partner_info(partner['partner_id'])
     
     def on_partner_double_click(self, event):
-        selection = self.partners_tree.selection()
-        if selection:
-            item = self.partners_tree.item(selection[0])
-            partner_id = item['values'][0]
-            self.edit_partner(partner_id)
+        partner = self.partners_tree.selected_record()
+        if partner:
+            self.edit_partner(partner['partner_id'])
     
+    def find_partner(self, partner_id: int) -> Optional[Dict[str, Any]]:
+        partner = self.partners_by_id.get(partner_id)
+        if partner is None:
+            partner = self.search_results.get(partner_id)
+        return partner
+
     def show_partner_info(self, partner_id: int):
-        partner = next((p for p in self.partners_data if p['partner_id'] == partner_id), None)
+        partner = self.find_partner(partner_id)
         if partner:
             self.current_partner_id = partner_id
             
@@ -372,36 +567,34 @@ class PartnersGUI:
     def add_partner(self):
         partner_form = PartnerForm(self.root, self.db_manager, title="Добавление партнера")
         if partner_form.result:
-            self.load_partners_data()
+            self.load_partners_data(staged=True)
             messagebox.showinfo("Успех", "Партнер успешно добавлен")
     
     def edit_partner(self, partner_id: Optional[int] = None):
         if partner_id is None:
-            selection = self.partners_tree.selection()
-            if not selection:
+            selected_partner = self.partners_tree.selected_record()
+            if not selected_partner:
                 messagebox.showwarning("Предупреждение", "Выберите партнера для редактирования")
                 return
-            item = self.partners_tree.item(selection[0])
-            partner_id = item['values'][0]
+            partner_id = selected_partner['partner_id']
         
-        partner = next((p for p in self.partners_data if p['partner_id'] == partner_id), None)
+        partner = self.find_partner(partner_id)
         if partner:
             partner_form = PartnerForm(self.root, self.db_manager, 
                                      title="Редактирование партнера", 
                                      partner_data=partner)
             if partner_form.result:
-                self.load_partners_data()
+                self.load_partners_data(staged=True)
                 messagebox.showinfo("Успех", "Данные партнера успешно обновлены")
     
     def delete_partner(self):
-        selection = self.partners_tree.selection()
-        if not selection:
+        selected_partner = self.partners_tree.selected_record()
+        if not selected_partner:
             messagebox.showwarning("Предупреждение", "Выберите партнера для удаления")
             return
         
-        item = self.partners_tree.item(selection[0])
-        partner_id = item['values'][0]
-        partner_name = item['values'][1]
+        partner_id = selected_partner['partner_id']
+        partner_name = selected_partner['partner_name']
         
         result = messagebox.askyesno("Подтверждение удаления", 
                                    f"Вы действительно хотите удалить партнера '{partner_name}'?\n\n"
@@ -410,7 +603,8 @@ class PartnersGUI:
         if result:
             try:
                 if self.db_manager.delete_partner(partner_id):
-                    self.load_partners_data()
+                    self.search_index.remove(partner_id)
+                    self.load_partners_data(staged=True)
                     messagebox.showinfo("Успех", "Партнер успешно удален")
                 else:
                     messagebox.showerror("Ошибка", "Не удалось удалить партнера")
@@ -422,24 +616,22 @@ class PartnersGUI:
             messagebox.showwarning("Предупреждение", "Выберите партнера для просмотра истории продаж")
             return
         
-        partner = next((p for p in self.partners_data if p['partner_id'] == self.current_partner_id), None)
+        partner = self.find_partner(self.current_partner_id)
         if partner:
-            sales_form = SalesHistoryForm(self.root, self.db_manager, partner)
+            sales_form = SalesHistoryForm(self.root, self.db_manager, partner, async_db=self.async_db)
     
     def open_material_calculator(self):
-        calc_form = MaterialCalculationForm(self.root, self.material_calculator)
+        calc_form = MaterialCalculationForm(self.root, self.material_calculator, async_db=self.async_db)
     
     def refresh_data(self):
-        self.load_partners_data()
+        self.load_partners_data(staged=True)
         messagebox.showinfo("Информация", "Данные обновлены")
     
-    def sort_treeview(self, col):
-        items = [(self.partners_tree.set(item, col), item) for item in self.partners_tree.get_children('')]
-
-        items.sort()
-
-        for index, (val, item) in enumerate(items):
-            self.partners_tree.move(item, '', index)
+    def on_partners_sort(self, sort_columns):
+        # Загруженные записи уже отсортированы в таблице; пока загружены не все,
+        # порядок передается в SQL-запрос и список загружается заново
+        if not self.partners_loaded:
+            self.load_partners_data()
     
     def run(self):
         try:
@@ -447,6 +639,8 @@ class PartnersGUI:
         except Exception as e:
             messagebox.showerror("Критическая ошибка", f"Произошла критическая ошибка: {e}")
         finally:
+            self.search_controller.shutdown()
+            self.async_db.shutdown()
             if self.db_manager:
                 self.db_manager.disconnect()
 
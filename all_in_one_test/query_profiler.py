@@ -0,0 +1,109 @@
+import atexit
+import re
+import threading
+from typing import Dict, Any, List, Optional
+
+
+class QueryProfiler:
+
+    # Верхние границы интервалов гистограммы задержек, мс
+    HISTOGRAM_BOUNDS_MS = [1, 5, 10, 50, 100, 500, 1000]
+
+    def __init__(self, slow_query_threshold: float = 0.1, report_on_exit: bool = True):
+        self.slow_query_threshold = slow_query_threshold
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._plans: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+        if report_on_exit:
+            atexit.register(self.print_report)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return re.sub(r'\s+', ' ', query).strip()
+
+    def record(self, connection, query: str, params: tuple, elapsed: float, rows: int, failed: bool = False):
+        statement = self.normalize(query)
+        elapsed_ms = elapsed * 1000
+
+        with self._lock:
+            entry = self.stats.get(statement)
+            if entry is None:
+                entry = {
+                    'calls': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'histogram': [0] * (len(self.HISTOGRAM_BOUNDS_MS) + 1)
+                }
+                self.stats[statement] = entry
+
+            entry['calls'] += 1
+            entry['errors'] += 1 if failed else 0
+            entry['rows'] += max(rows, 0)
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['histogram'][self._bucket_index(elapsed_ms)] += 1
+
+        if not failed and elapsed >= self.slow_query_threshold:
+            self._log_slow_query(connection, statement, query, params, elapsed_ms)
+
+    def _bucket_index(self, elapsed_ms: float) -> int:
+        for index, bound in enumerate(self.HISTOGRAM_BOUNDS_MS):
+            if elapsed_ms <= bound:
+                return index
+        return len(self.HISTOGRAM_BOUNDS_MS)
+
+    def _log_slow_query(self, connection, statement: str, query: str, params: tuple, elapsed_ms: float):
+        print(f"Медленный запрос ({elapsed_ms:.1f} мс): {statement}")
+
+        plan = self._plans.get(statement)
+        if plan is None:
+            plan = self._explain(connection, query, params)
+            self._plans[statement] = plan
+        for line in plan:
+            print(f"    {line}")
+
+    @staticmethod
+    def _explain(connection, query: str, params: tuple) -> List[str]:
+        # План запроса строится только для выборок
+        if not re.match(r'\s*(SELECT|WITH)\b', query, re.IGNORECASE):
+            return []
+        try:
+            rows = connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            return [row[3] for row in rows]
+        except Exception as e:
+            return [f"Не удалось получить план запроса: {e}"]
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self._plans.clear()
+
+    def get_report(self, limit: Optional[int] = 20) -> str:
+        with self._lock:
+            entries = sorted(self.stats.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+
+        if not entries:
+            return "Статистика запросов пуста"
+
+        labels = [f"<={bound}" for bound in self.HISTOGRAM_BOUNDS_MS] + [f">{self.HISTOGRAM_BOUNDS_MS[-1]}"]
+        lines = ["Статистика SQL-запросов (по суммарному времени):"]
+        for statement, entry in entries[:limit]:
+            average_ms = entry['total_ms'] / entry['calls']
+            histogram = ", ".join(
+                f"{label}: {count}" for label, count in zip(labels, entry['histogram']) if count
+            )
+            lines.append(
+                f"- {entry['calls']} вызовов, всего {entry['total_ms']:.1f} мс, "
+                f"среднее {average_ms:.2f} мс, максимум {entry['max_ms']:.1f} мс, "
+                f"строк {entry['rows']}, ошибок {entry['errors']}"
+            )
+            lines.append(f"  мс [{histogram}]")
+            lines.append(f"  {statement[:200]}")
+        return "\n".join(lines)
+
+    def print_report(self):
+        if self.stats:
+            print(self.get_report())
@@ -1,19 +1,34 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkinter import font as tkfont
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from search_controller import SearchController
+from virtual_treeview import VirtualTreeview
 from datetime import datetime
 import csv
 import os
 
 class SalesHistoryForm:
+
+    # Столбцы таблицы и соответствующие поля для сортировки
+    SALES_SORT_FIELDS = {
+        'ID': 'sale_id',
+        'Продукт': 'product_name',
+        'Количество': 'quantity',
+        'Дата продажи': 'sale_date'
+    }
     
-    def __init__(self, parent, db_manager: DatabaseManager, partner_data: Dict[str, Any]):
+    def __init__(self, parent, db_manager: DatabaseManager, partner_data: Dict[str, Any],
+                 async_db: Optional[AsyncDatabaseManager] = None):
         self.parent = parent
         self.db_manager = db_manager
         self.partner_data = partner_data
         self.sales_data = []
+        self.load_generation = 0
+        self.sales_loaded = False
+        self.load_order_by = []
 
         self.window = tk.Toplevel(parent)
         self.window.title(f"История продаж - {partner_data['partner_name']}")
@@ -22,6 +37,10 @@ class SalesHistoryForm:
         self.window.transient(parent)
         self.window.grab_set()
 
+        self.owns_async_db = async_db is None
+        self.async_db = async_db or AsyncDatabaseManager(db_manager, self.window)
+        self.search_controller = SearchController(self.window, self.run_sales_search, self.on_sales_search_done)
+
         self.center_window()
 
         self.setup_styles()
@@ -31,6 +50,10 @@ class SalesHistoryForm:
         self.load_sales_data()
 
         self.window.wait_window()
+
+        self.search_controller.shutdown()
+        if self.owns_async_db:
+            self.async_db.shutdown()
     
     def setup_styles(self):
         self.colors = {
@@ -126,29 +149,29 @@ class SalesHistoryForm:
 
         columns = ('ID', 'Продукт', 'Количество', 'Дата продажи')
         
-        self.sales_tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=15)
+        self.sales_tree = VirtualTreeview(table_frame, columns,
+                                          row_values=self.sale_row_values,
+                                          row_key=lambda sale: sale['sale_id'],
+                                          sort_keys={
+                                              col: lambda sale, field=field: DatabaseManager.sort_value(
+                                                  sale, field, DatabaseManager.SALES_SORT_COLUMNS)
+                                              for col, field in self.SALES_SORT_FIELDS.items()
+                                          },
+                                          on_sort=self.on_sales_sort,
+                                          height=15)
+        tree = self.sales_tree.tree
 
         for col in columns:
-            self.sales_tree.heading(col, text=col, command=lambda c=col: self.sort_table(c))
-            self.sales_tree.column(col, width=150, minwidth=100)
+            tree.column(col, width=150, minwidth=100)
 
-        self.sales_tree.column('ID', width=80, minwidth=60)
-        self.sales_tree.column('Продукт', width=250, minwidth=200)
-        self.sales_tree.column('Количество', width=120, minwidth=100)
-        self.sales_tree.column('Дата продажи', width=150, minwidth=120)
+        tree.column('ID', width=80, minwidth=60)
+        tree.column('Продукт', width=250, minwidth=200)
+        tree.column('Количество', width=120, minwidth=100)
+        tree.column('Дата продажи', width=150, minwidth=120)
 
-        v_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.sales_tree.yview)
-        h_scrollbar = ttk.Scrollbar(table_frame, orient=tk.HORIZONTAL, command=self.sales_tree.xview)
-        self.sales_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-
-        self.sales_tree.grid(row=0, column=0, sticky='nsew')
-        v_scrollbar.grid(row=0, column=1, sticky='ns')
-        h_scrollbar.grid(row=1, column=0, sticky='ew')
-        
-        table_frame.grid_rowconfigure(0, weight=1)
-        table_frame.grid_columnconfigure(0, weight=1)
+        self.sales_tree.pack(fill=tk.BOTH, expand=True)
 
-        self.sales_tree.bind('<Double-1>', self.on_sale_double_click)
+        tree.bind('<Double-1>', self.on_sale_double_click, add='+')
     
     def create_toolbar(self, parent):
         toolbar_frame = ttk.Frame(parent)
@@ -176,51 +199,122 @@ class SalesHistoryForm:
         search_entry.pack(side=tk.LEFT, padx=(5, 0))
     
     def load_sales_data(self):
-        try:
-            self.sales_data = self.db_manager.get_partner_sales_history(self.partner_data['partner_id'])
+        # Первая страница отображается сразу, остальные догружаются в потоке базы данных
+        self.load_generation += 1
+        self.sales_loaded = False
+        self.load_order_by = [
+            (self.SALES_SORT_FIELDS[col], descending) for col, descending in self.sales_tree.sort_columns
+        ]
+        self.request_sales_page(self.load_generation, None)
+        self.async_db.get_partner_sales_summary(
+            self.partner_data['partner_id'],
+            callback=self.update_statistics,
+            error_callback=self.on_sales_load_error
+        )
+
+    def request_sales_page(self, generation: int, cursor):
+        self.async_db.get_partner_sales_history_page(
+            self.partner_data['partner_id'], cursor,
+            order_by=self.load_order_by,
+            callback=lambda result: self.on_sales_page_loaded(generation, cursor, result),
+            error_callback=self.on_sales_load_error
+        )
+
+    def on_sales_page_loaded(self, generation: int, cursor, result):
+        if generation != self.load_generation or not self.window.winfo_exists():
+            return
+
+        page, next_cursor = result
+        if cursor is None:
+            self.sales_data = page
             self.update_sales_table()
-            self.update_statistics()
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка загрузки данных о продажах: {e}")
-    
-    def update_sales_table(self):
-        for item in self.sales_tree.get_children():
-            self.sales_tree.delete(item)
+        else:
+            self.sales_data.extend(page)
+            self.insert_sales_rows(self.filter_sales(page))
+
+        if next_cursor is not None:
+            self.request_sales_page(generation, next_cursor)
+        else:
+            self.sales_loaded = True
 
+    def on_sales_load_error(self, error: Exception):
+        messagebox.showerror("Ошибка", f"Ошибка загрузки данных о продажах: {error}")
+
+    @staticmethod
+    def sale_matches(sale: Dict[str, Any], search_text: str) -> bool:
+        return (search_text in sale['product_name'].lower() or
+                search_text in str(sale['quantity']) or
+                search_text in sale['sale_date'])
+
+    def filter_sales(self, sales):
         search_text = self.search_var.get().lower()
-        filtered_data = self.sales_data
-        
-        if search_text:
-            filtered_data = [
-                sale for sale in self.sales_data
-                if search_text in sale['product_name'].lower() or
-                   search_text in str(sale['quantity']) or
-                   search_text in sale['sale_date']
-            ]
-        
-        for sale in filtered_data:
-            values = (
-                sale['sale_id'],
-                sale['product_name'],
-                f"{sale['quantity']:,}",
-                sale['sale_date']
-            )
-            
-            self.sales_tree.insert('', 'end', values=values)
+        if not search_text:
+            return sales
+
+        return [sale for sale in sales if self.sale_matches(sale, search_text)]
+
+    def run_sales_search(self, search_text: str):
+        # Выполняется в потоке поиска по снимку уже загруженных продаж
+        sales = self.sales_data
+        loaded_count = len(sales)
+        search_text = search_text.lower()
+        found = self.search_controller.filter(
+            sales[:loaded_count],
+            lambda sale: self.sale_matches(sale, search_text)
+        )
+        return found, sales, loaded_count
+
+    def on_sales_search_done(self, search_text: str, result):
+        if not self.window.winfo_exists():
+            return
+
+        found, sales, loaded_count = result
+        self.render_sales(found)
+
+        # Страницы, загруженные во время поиска, дофильтровываются здесь
+        if sales is self.sales_data and len(sales) > loaded_count:
+            self.insert_sales_rows(self.filter_sales(sales[loaded_count:]))
     
-    def update_statistics(self):
-        if not self.sales_data:
+    def update_sales_table(self, immediate: bool = True):
+        search_text = self.search_var.get()
+        if not search_text:
+            self.search_controller.cancel()
+            self.render_sales(self.sales_data)
+        elif immediate:
+            self.search_controller.run(search_text)
+        else:
+            self.search_controller.schedule(search_text)
+
+    def render_sales(self, sales):
+        self.sales_tree.set_rows(sales)
+
+    def insert_sales_rows(self, sales):
+        self.sales_tree.append_rows(sales)
+
+    @staticmethod
+    def sale_row_values(sale: Dict[str, Any]) -> tuple:
+        return (
+            sale['sale_id'],
+            sale['product_name'],
+            f"{sale['quantity']:,}",
+            sale['sale_date']
+        )
+    
+    def update_statistics(self, summary: Dict[str, Any]):
+        if not self.window.winfo_exists():
+            return
+
+        if not summary['sale_count']:
             self.total_sales_label.config(text="0")
             self.transactions_count_label.config(text="0")
             self.current_discount_label.config(text="0%")
             self.registration_date_label.config(text="")
             return
 
-        total_sales = sum(sale['quantity'] for sale in self.sales_data)
-        self.total_sales_label.config(text=f"{total_sales:,}")
+        # Итоги берутся из сводной таблицы, а не из загруженной страницы
+        self.total_sales_label.config(text=f"{summary['total_quantity']:,}")
 
-        transactions_count = len(self.sales_data)
-        self.transactions_count_label.config(text=str(transactions_count))
+        self.transactions_count_label.config(text=str(summary['sale_count']))
 
         current_discount = self.partner_data.get('discount_percentage', 0)
         self.current_discount_label.config(text=f"{current_discount}%")
@@ -230,16 +324,12 @@ class SalesHistoryForm:
             self.registration_date_label.config(text=str(registration_date))
     
     def on_search_change(self, *args):
-        self.update_sales_table()
+        self.update_sales_table(immediate=False)
     
     def on_sale_double_click(self, event):
-        selection = self.sales_tree.selection()
-        if selection:
-            item = self.sales_tree.item(selection[0])
-            sale_id = item['values'][0]
-            product_name = item['values'][1]
-            quantity = item['values'][2]
-            sale_date = item['values'][3]
+        sale = self.sales_tree.selected_record()
+        if sale:
+            sale_id, product_name, quantity, sale_date = self.sale_row_values(sale)
             
             # Показ детальной информации о продаже
             messagebox.showinfo("Детали продажи", 
@@ -266,7 +356,7 @@ class SalesHistoryForm:
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                 
                 writer.writeheader()
-                for sale in self.sales_data:
+                for sale in self.db_manager.iter_partner_sales_history(self.partner_data['partner_id']):
                     writer.writerow({
                         'ID продажи': sale['sale_id'],
                         'Продукт': sale['product_name'],
@@ -283,10 +373,7 @@ class SalesHistoryForm:
         self.load_sales_data()
         messagebox.showinfo("Информация", "Данные обновлены")
     
-    def sort_table(self, col):
-        items = [(self.sales_tree.set(item, col), item) for item in self.sales_tree.get_children('')]
-
-        items.sort()
-
-        for index, (val, item) in enumerate(items):
-            self.sales_tree.move(item, '', index)
+    def on_sales_sort(self, sort_columns):
+        # Пока загружены не все продажи, порядок передается в SQL-запрос
+        if not self.sales_loaded:
+            self.load_sales_data()
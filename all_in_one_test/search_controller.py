@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+from tk_result_pump import TkResultPump
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class SearchController:
+
+    # Пауза после последнего нажатия клавиши перед запуском поиска, мс
+    DEFAULT_DELAY_MS = 250
+
+    # Через сколько записей фильтр проверяет, не устарел ли запрос
+    CANCEL_CHECK_INTERVAL = 2000
+
+    def __init__(self, widget, search: Callable[[str], Any], apply: Callable[[str, Any], None],
+                 delay_ms: int = DEFAULT_DELAY_MS,
+                 error_callback: Optional[Callable[[Exception], None]] = None):
+        self.widget = widget
+        self.search = search
+        self.apply = apply
+        self.delay_ms = delay_ms
+        self.error_callback = error_callback
+
+        # Фильтрация выполняется в отдельном потоке, чтобы не блокировать интерфейс
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self._pump = TkResultPump(widget, self._deliver, "Ошибка обработки результата поиска")
+        self._local = threading.local()
+        self._generation = 0
+        self._after_id = None
+        self._future: Optional[Future] = None
+
+    def schedule(self, text: str):
+        # Каждое нажатие откладывает поиск, выполняется только последний запрос
+        self.cancel()
+        self._after_id = self.widget.after(self.delay_ms, lambda: self.run(text))
+
+    def run(self, text: str) -> Future:
+        self.cancel()
+        generation = self._generation
+
+        self._future = self._executor.submit(self._run_search, generation, text)
+        self._pump.track(self._future, generation, text)
+        return self._future
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+        # Запущенный запрос устаревает и прерывается при следующей проверке
+        self._generation += 1
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def _run_search(self, generation: int, text: str) -> Any:
+        self._local.generation = generation
+        return self.search(text)
+
+    def is_cancelled(self) -> bool:
+        return getattr(self._local, 'generation', None) != self._generation
+
+    def filter(self, items: Iterable[Any], predicate: Callable[[Any], bool]) -> List[Any]:
+        result = []
+        for index, item in enumerate(items):
+            if index % self.CANCEL_CHECK_INTERVAL == 0 and self.is_cancelled():
+                raise SearchCancelled()
+            if predicate(item):
+                result.append(item)
+        return result
+
+    def _deliver(self, future: Future, generation: int, text: str):
+        # Вызывается в потоке Tk: применяется только результат последнего запроса
+        if generation != self._generation or future.cancelled():
+            return
+
+        self._future = None
+        error = future.exception()
+        if isinstance(error, SearchCancelled):
+            return
+
+        if error is not None:
+            if self.error_callback:
+                self.error_callback(error)
+            else:
+                print(f"Ошибка поиска: {error}")
+        else:
+            self.apply(text, future.result())
+
+    def shutdown(self):
+        try:
+            self.cancel()
+        except Exception:
+            pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,52 @@
+import queue
+from concurrent.futures import Future
+from typing import Any, Callable
+
+
+class TkResultPump:
+
+    # Период опроса очереди результатов из цикла Tk, мс
+    POLL_INTERVAL_MS = 15
+
+    def __init__(self, widget, deliver: Callable[..., None], error_message: str = "Ошибка обработки результата"):
+        # deliver(future, *context) вызывается в потоке Tk для каждой завершенной задачи
+        self.widget = widget
+        self.deliver = deliver
+        self.error_message = error_message
+
+        self._results = queue.Queue()
+        self._pending = 0
+        self._polling = False
+
+    def track(self, future: Future, *context: Any):
+        # Вызывается в потоке Tk; future может завершиться в любом потоке
+        self._pending += 1
+        future.add_done_callback(lambda done: self._results.put((done, context)))
+        self._schedule_poll()
+
+    def _schedule_poll(self):
+        if self._polling:
+            return
+        self._polling = True
+        try:
+            self.widget.after(self.POLL_INTERVAL_MS, self._poll)
+        except Exception:
+            self._polling = False
+
+    def _poll(self):
+        # Вызывается в потоке Tk: только здесь результаты передаются в интерфейс
+        self._polling = False
+        while True:
+            try:
+                future, context = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            self._pending -= 1
+            try:
+                self.deliver(future, *context)
+            except Exception as e:
+                print(f"{self.error_message}: {e}")
+
+        if self._pending > 0:
+            self._schedule_poll()
@@ -0,0 +1,303 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class VirtualTreeview(ttk.Frame):
+
+    # Строки сверх видимой области, чтобы при изменении размера не было пустого места
+    BUFFER_ROWS = 2
+    DEFAULT_ROW_HEIGHT = 20
+
+    def __init__(self, parent, columns: Sequence[str],
+                 row_values: Callable[[Any], tuple],
+                 row_key: Callable[[Any], Hashable],
+                 row_tags: Optional[Callable[[Any], tuple]] = None,
+                 sort_keys: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                 on_sort: Optional[Callable[[List[Tuple[str, bool]]], None]] = None,
+                 height: int = 20):
+        super().__init__(parent)
+        self.columns = tuple(columns)
+        self.row_values = row_values
+        self.row_key = row_key
+        self.row_tags = row_tags or (lambda record: ())
+
+        # Типизированные ключи сортировки по столбцам; порядок задается списком (столбец, по убыванию)
+        self.sort_keys = sort_keys or {}
+        self.sort_columns: List[Tuple[str, bool]] = []
+        self.on_sort = on_sort
+
+        # Данные хранятся в Python, в Treeview создаются только строки видимого окна
+        self.records: List[Any] = []
+        self.offset = 0
+        self.visible_rows = height
+        self.selected_key: Optional[Hashable] = None
+        # Индекс ключ записи -> позиция в records, строится при первом обращении после изменения данных
+        self._key_index: Optional[Dict[Hashable, int]] = None
+        self._slots: List[str] = []
+        self._slot_records: Dict[str, Any] = {}
+        self._slot_rows: Dict[str, tuple] = {}
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show='headings', height=height, selectmode='browse')
+        self.v_scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+        self.h_scrollbar = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.h_scrollbar.set)
+
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.v_scrollbar.grid(row=0, column=1, sticky='ns')
+        self.h_scrollbar.grid(row=1, column=0, sticky='ew')
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self._update_headings()
+
+        self.tree.bind('<Shift-ButtonPress-1>', self.on_shift_click)
+        self.tree.bind('<Configure>', self.on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.tree.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll_by(3))
+        self.tree.bind('<Up>', lambda event: self.move_selection(-1))
+        self.tree.bind('<Down>', lambda event: self.move_selection(1))
+        self.tree.bind('<Prior>', lambda event: self.move_selection(-self.visible_rows))
+        self.tree.bind('<Next>', lambda event: self.move_selection(self.visible_rows))
+        self.tree.bind('<Home>', lambda event: self.move_selection(-len(self.records)))
+        self.tree.bind('<End>', lambda event: self.move_selection(len(self.records)))
+
+    def set_rows(self, records: List[Any]):
+        self.records = list(records)
+        self.sort_records()
+        self._key_index = None
+        self.offset = self._clamp_offset(self.offset)
+        self.refresh()
+
+    def update_rows(self, records: List[Any]) -> int:
+        # Сверка с отображаемыми данными по ключу записи: прокрутка привязана
+        # к первой видимой записи, в Treeview меняются только отличающиеся строки
+        anchor_key = self.row_key(self.records[self.offset]) if self.offset < len(self.records) else None
+
+        self.records = list(records)
+        self.sort_records()
+        self._key_index = None
+        if anchor_key is not None:
+            anchor_index = self.index_of(anchor_key)
+            if anchor_index is not None:
+                self.offset = anchor_index
+        self.offset = self._clamp_offset(self.offset)
+        return self.refresh()
+
+    def append_rows(self, records: List[Any]):
+        if not records:
+            return
+        if self._key_index is not None:
+            for index, record in enumerate(records, start=len(self.records)):
+                self._key_index[self.row_key(record)] = index
+        self.records.extend(records)
+
+        # Новые строки перерисовываются только если попадают в видимое окно
+        if len(self._slots) < self.visible_rows + self.BUFFER_ROWS:
+            self.refresh()
+        else:
+            self._update_scrollbar()
+
+    def clear(self):
+        self.set_rows([])
+
+    def refresh(self) -> int:
+        changed_count = 0
+        needed = max(0, min(self.visible_rows + self.BUFFER_ROWS, len(self.records) - self.offset))
+        while len(self._slots) < needed:
+            self._slots.append(self.tree.insert('', 'end'))
+        while len(self._slots) > needed:
+            item = self._slots.pop()
+            self._slot_records.pop(item, None)
+            self._slot_rows.pop(item, None)
+            self.tree.delete(item)
+            changed_count += 1
+
+        for index, item in enumerate(self._slots):
+            record = self.records[self.offset + index]
+            self._slot_records[item] = record
+            row = (self.row_values(record), self.row_tags(record))
+            if self._slot_rows.get(item) != row:
+                self.tree.item(item, values=row[0], tags=row[1])
+                self._slot_rows[item] = row
+                changed_count += 1
+
+        # Выбранная запись находится по индексу ключей, в том числе после сверки update_rows
+        selected_item = self.item_for_key(self.selected_key) if self.selected_key is not None else None
+        current_selection = self.tree.selection()
+        if selected_item is not None:
+            if current_selection != (selected_item,):
+                self.tree.selection_set(selected_item)
+                self.tree.focus(selected_item)
+        elif current_selection:
+            self.tree.selection_remove(*current_selection)
+
+        # Прокрутка выполняется сменой данных в строках, сам Treeview всегда в начале
+        self.tree.yview_moveto(0)
+        self._update_scrollbar()
+        return changed_count
+
+    def _update_scrollbar(self):
+        total = len(self.records)
+        if total == 0:
+            self.v_scrollbar.set(0, 1)
+            return
+        self.v_scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+
+    def _clamp_offset(self, offset: int) -> int:
+        return max(0, min(offset, len(self.records) - self.visible_rows))
+
+    def scroll_to(self, offset: int):
+        offset = self._clamp_offset(offset)
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+        else:
+            self._update_scrollbar()
+
+    def scroll_by(self, rows: int) -> str:
+        self.scroll_to(self.offset + rows)
+        return 'break'
+
+    def on_scroll(self, action: str, *args):
+        if action == 'moveto':
+            self.scroll_to(int(float(args[0]) * len(self.records)))
+        elif action == 'scroll':
+            step = self.visible_rows if args[1] == 'pages' else 1
+            self.scroll_to(self.offset + int(args[0]) * step)
+
+    def on_mouse_wheel(self, event) -> str:
+        # На Windows delta кратна 120, на macOS приходят малые значения
+        rows = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        return self.scroll_by(rows * 3 if rows else 0)
+
+    def on_configure(self, event):
+        row_height = self._row_height()
+        header_height = row_height
+        if self._slots:
+            bbox = self.tree.bbox(self._slots[0])
+            if bbox:
+                header_height = bbox[1]
+
+        visible_rows = max(1, (event.height - header_height) // row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.offset = self._clamp_offset(self.offset)
+            self.refresh()
+
+    def _row_height(self) -> int:
+        try:
+            return int(ttk.Style().lookup('Treeview', 'rowheight') or self.DEFAULT_ROW_HEIGHT)
+        except (tk.TclError, ValueError):
+            return self.DEFAULT_ROW_HEIGHT
+
+    def on_select(self, event):
+        # Выбор хранится по ключу записи и переживает прокрутку строк
+        selection = self.tree.selection()
+        if not selection:
+            return
+        record = self._slot_records.get(selection[0])
+        if record is not None:
+            self.selected_key = self.row_key(record)
+
+    def index_of(self, key: Hashable) -> Optional[int]:
+        if self._key_index is None:
+            self._key_index = {self.row_key(record): index for index, record in enumerate(self.records)}
+        return self._key_index.get(key)
+
+    def record_for_key(self, key: Hashable) -> Optional[Any]:
+        index = self.index_of(key)
+        return self.records[index] if index is not None else None
+
+    def item_for_key(self, key: Hashable) -> Optional[str]:
+        # Элемент Treeview есть только у записей видимого окна
+        index = self.index_of(key)
+        if index is None or not self.offset <= index < self.offset + len(self._slots):
+            return None
+        return self._slots[index - self.offset]
+
+    def selected_record(self) -> Optional[Any]:
+        if self.selected_key is None:
+            return None
+        return self.record_for_key(self.selected_key)
+
+    def select(self, key: Hashable):
+        index = self.index_of(key)
+        if index is None:
+            return
+        self.selected_key = key
+        self.see_index(index)
+        self.refresh()
+
+    def see_index(self, index: int):
+        if index < self.offset:
+            self.offset = self._clamp_offset(index)
+        elif index >= self.offset + self.visible_rows:
+            self.offset = self._clamp_offset(index - self.visible_rows + 1)
+
+    def move_selection(self, delta: int) -> str:
+        if not self.records:
+            return 'break'
+
+        index = self.index_of(self.selected_key) if self.selected_key is not None else None
+        if index is None:
+            index = self.offset
+        else:
+            index = max(0, min(len(self.records) - 1, index + delta))
+        self.select(self.row_key(self.records[index]))
+        return 'break'
+
+    def on_shift_click(self, event):
+        # Shift+клик по заголовку добавляет столбец к сортировке
+        if self.tree.identify_region(event.x, event.y) != 'heading':
+            return None
+        column_index = int(self.tree.identify_column(event.x).lstrip('#')) - 1
+        if 0 <= column_index < len(self.columns):
+            self.toggle_sort(self.columns[column_index], multi=True)
+        return 'break'
+
+    def toggle_sort(self, column: str, multi: bool = False) -> List[Tuple[str, bool]]:
+        # Повторный клик по столбцу меняет направление сортировки
+        directions = dict(self.sort_columns)
+        if multi and self.sort_columns:
+            if column in directions:
+                self.sort_columns = [
+                    (name, not descending if name == column else descending) for name, descending in self.sort_columns
+                ]
+            else:
+                self.sort_columns.append((column, False))
+        elif self.sort_columns and self.sort_columns[0][0] == column:
+            self.sort_columns = [(column, not directions[column])]
+        else:
+            self.sort_columns = [(column, False)]
+
+        self._update_headings()
+        self.sort_records()
+        self._key_index = None
+        self.refresh()
+        if self.on_sort:
+            self.on_sort(self.sort_columns)
+        return self.sort_columns
+
+    def sort_key(self, column: str) -> Callable[[Any], Any]:
+        key = self.sort_keys.get(column)
+        if key is None:
+            column_index = self.columns.index(column)
+            key = lambda record: str(self.row_values(record)[column_index])
+        return key
+
+    def sort_records(self):
+        # Устойчивая сортировка от младшего столбца к старшему
+        for column, descending in reversed(self.sort_columns):
+            self.records.sort(key=self.sort_key(column), reverse=descending)
+
+    def _update_headings(self):
+        for column in self.columns:
+            text = column
+            for position, (name, descending) in enumerate(self.sort_columns):
+                if name == column:
+                    marker = '▼' if descending else '▲'
+                    text = f"{column} {marker}{position + 1 if len(self.sort_columns) > 1 else ''}"
+            self.tree.heading(column, text=text, command=lambda name=column: self.toggle_sort(name))